@@ -0,0 +1,116 @@
+from shutil import copyfileobj
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+from . import private_storage
+
+
+CHUNK_PREFIX = 'chunks'
+
+
+class ChunkError(Exception):
+    pass
+
+
+class ChunkStore:
+    def get_dir(self, uid):
+        return '{}/{}'.format(CHUNK_PREFIX, uid)
+
+    def get_key(self, uid, index):
+        return '{}/{}'.format(self.get_dir(uid), index)
+
+    def key(self, uid):
+        return 'chunk:{}'.format(uid)
+
+    def count(self, size, chunk_size):
+        return max(1, -(-size // chunk_size))
+
+    def listdir(self, name):
+        try:
+            return private_storage.listdir(name)
+        except FileNotFoundError:
+            return [], []
+
+    def sweep(self):
+        uids, names = self.listdir(CHUNK_PREFIX)
+        for uid in uids:
+            if cache.get(self.key(uid)) is None:
+                self.delete(uid)
+
+    def create(self, user, name, size, data):
+        if size <= 0 or size > settings.FILE_UPLOAD_MAX_TEMP_SIZE:
+            raise ChunkError('Upload size must be between 1 and {} bytes.'.format(settings.FILE_UPLOAD_MAX_TEMP_SIZE))
+        self.sweep()
+        uid = uuid4().hex
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+        session = {
+            'username': user.get_username(),
+            'name': name,
+            'size': size,
+            'chunk_size': chunk_size,
+            'data': data,
+        }
+        cache.set(self.key(uid), session, settings.UPLOAD_CHUNK_TIMEOUT)
+        return uid
+
+    def get(self, user, uid):
+        session = cache.get(self.key(uid))
+        if session is None or session['username'] != user.get_username():
+            return None
+        return session
+
+    def write(self, uid, session, index, content):
+        size = session['size']
+        chunk_size = session['chunk_size']
+        if index < 0 or index >= self.count(size, chunk_size):
+            raise ChunkError('Chunk index out of range.')
+        start = index * chunk_size
+        expected = min(chunk_size, size - start)
+        if len(content) != expected:
+            raise ChunkError('Chunk {} must have {} bytes (it has {}).'.format(index, expected, len(content)))
+        private_storage.save(self.get_key(uid, index), ContentFile(content))
+
+    def missing(self, uid, session):
+        dirs, names = self.listdir(self.get_dir(uid))
+        received = set(names)
+        return [index for index in range(self.count(session['size'], session['chunk_size'])) if str(index) not in received]
+
+    def status(self, uid, session):
+        missing = self.missing(uid, session)
+        if missing:
+            offset = missing[0] * session['chunk_size']
+        else:
+            offset = session['size']
+        return {
+            'size': session['size'],
+            'chunk_size': session['chunk_size'],
+            'offset': offset,
+            'missing': missing,
+        }
+
+    def open(self, uid, session):
+        if self.missing(uid, session):
+            raise ChunkError('Upload is not complete.')
+        file = TemporaryUploadedFile(session['name'], None, session['size'], None)
+        try:
+            for index in range(self.count(session['size'], session['chunk_size'])):
+                with private_storage.open(self.get_key(uid, index), 'rb') as chunk:
+                    copyfileobj(chunk, file)
+        except FileNotFoundError:
+            file.close()
+            raise ChunkError('Upload expired.')
+        file.seek(0)
+        return file
+
+    def delete(self, uid):
+        cache.delete(self.key(uid))
+        dirs, names = self.listdir(self.get_dir(uid))
+        for name in names:
+            private_storage.delete('{}/{}'.format(self.get_dir(uid), name))
+
+
+chunk_store = ChunkStore()
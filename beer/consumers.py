@@ -50,11 +50,30 @@ class Consumer(AsyncJsonWebsocketConsumer):
 
 
 class UploadConsumer(Consumer):
+    public = ['wait']
+
+    waiting = False
+
     async def after_accept(self):
         await self.send_client('accept', self.channel_name)
 
+    async def client_wait(self):
+        self.waiting = True
+
     async def handler_report(self, event):
         await self.send_client('report', *event['args'])
 
     async def handler_complete(self, event):
+        if not self.waiting:
+            await self.close()
+
+    async def handler_stage(self, event):
+        await self.send_client('stage', *event['args'])
+
+    async def handler_brewed(self, event):
+        await self.send_client('brewed', *event['args'])
+        await self.close()
+
+    async def handler_failed(self, event):
+        await self.send_client('failed', *event['args'])
         await self.close()
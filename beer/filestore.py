@@ -5,6 +5,7 @@ from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.urls import reverse
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
 
 from .s3 import sign_post
 
@@ -16,7 +17,72 @@ class OverwriteStorage:
         return super().save(name, content, max_length)
 
 
+class LocalWriter:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, 'wb')
+        self.committed = False
+
+    def write(self, data):
+        self.file.write(data)
+
+    def commit(self):
+        self.file.close()
+        self.committed = True
+
+    def close(self):
+        if not self.committed:
+            self.file.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.committed = True
+
+
+class MultipartWriter:
+    def __init__(self, bucket, key):
+        self.client = bucket.meta.client
+        self.bucket_name = bucket.name
+        self.key = key
+        self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)['UploadId']
+        self.parts = []
+        self.buffer = bytearray()
+        self.committed = False
+
+    def flush(self):
+        number = len(self.parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=bytes(self.buffer))
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self.buffer.clear()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        if len(self.buffer) >= settings.UPLOAD_PART_SIZE:
+            self.flush()
+
+    def commit(self):
+        if self.buffer or not self.parts:
+            self.flush()
+        self.client.complete_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts})
+        self.committed = True
+
+    def close(self):
+        if not self.committed:
+            self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+            self.committed = True
+
+
 class LocalStorage(OverwriteStorage, FileSystemStorage):
+    def writer(self, name):
+        return LocalWriter(self.path(name))
+
+    def move(self, name, storage, new_name):
+        path = storage.path(new_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.path(name), path)
+
     def clear(self):
         try:
             shutil.rmtree(self.location)
@@ -43,6 +109,20 @@ class PrivateLocalStorage(LocalStorage):
 
 
 class RemoteStorage(OverwriteStorage, S3Boto3Storage):
+    def key(self, name):
+        return self._normalize_name(clean_name(name))
+
+    def writer(self, name):
+        return MultipartWriter(self.bucket, self.key(name))
+
+    def move(self, name, storage, new_name):
+        source = {
+            'Bucket': self.bucket_name,
+            'Key': self.key(name),
+        }
+        storage.bucket.Object(storage.key(new_name)).copy_from(CopySource=source)
+        self.delete(name)
+
     def clear(self):
         self.bucket.objects.delete()
 
@@ -1,16 +1,23 @@
 from channels.auth import AuthMiddlewareStack
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 
-from .utils import build_routepatterns
+from .utils import build_routepatterns, build_channelroutes
 
 
 routeprefixes = {
 }
 
+channelnames = {
+    'brew': 'malt.consumers.BrewConsumer',
+}
+
 application = ProtocolTypeRouter({
     'websocket': AuthMiddlewareStack(
         URLRouter(
             build_routepatterns(routeprefixes)
         )
     ),
+    'channel': ChannelNameRouter(
+        build_channelroutes(channelnames)
+    ),
 })
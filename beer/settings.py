@@ -98,21 +98,28 @@ CACHES = {
 }
 
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [
-                {
-                    'address': (
-                        env.str('BROKER_HOST', 'localhost'),
-                        env.int('BROKER_PORT', 6378),
-                    ),
-                },
-            ],
+if env.bool('BROKER_MEMORY', False):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
-}
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [
+                    {
+                        'address': (
+                            env.str('BROKER_HOST', 'localhost'),
+                            env.int('BROKER_PORT', 6378),
+                        ),
+                    },
+                ],
+            },
+        },
+    }
 
 
 DATABASES = {
@@ -154,13 +161,53 @@ USE_L10N = True
 USE_TZ = True
 
 
+FILE_UPLOAD_MAX_MEMORY_SIZE = env.int('FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440)
+
 FILE_UPLOAD_MAX_TEMP_SIZE = 26214400
 
 FILE_UPLOAD_HANDLERS = [
-    BASE_NAME + '.uphandler.ChannelMemoryFileUploadHandler',
-    BASE_NAME + '.uphandler.ChannelTemporaryFileUploadHandler',
+    BASE_NAME + '.uphandler.ChannelAdaptiveFileUploadHandler',
 ]
 
+UPLOAD_STORAGE_THRESHOLD = env.int('UPLOAD_STORAGE_THRESHOLD', 10485760)
+
+UPLOAD_CHUNK_SIZE = env.int('UPLOAD_CHUNK_SIZE', 1048576)
+
+UPLOAD_CHUNK_TIMEOUT = env.int('UPLOAD_CHUNK_TIMEOUT', 86400)
+
+UPLOAD_PART_SIZE = env.int('UPLOAD_PART_SIZE', 8388608)
+
+UPLOAD_STAGING_LOCATION = env.str('UPLOAD_STAGING_LOCATION', 'uploads')
+
+UPLOAD_REPORT_INTERVAL = env.float('UPLOAD_REPORT_INTERVAL', 0.25)
+
+UPLOAD_REPORT_STEP = env.int('UPLOAD_REPORT_STEP', 5)
+
+UPLOAD_REPORT_BACKGROUND = env.bool('UPLOAD_REPORT_BACKGROUND', not env.bool('BROKER_MEMORY', False))
+
+
+BREW_CACHE_TIMEOUT = env.int('BREW_CACHE_TIMEOUT', 3600)
+
+BREW_ASYNC = env.bool('BREW_ASYNC', False)
+
+BREW_EXECUTOR = env.str('BREW_EXECUTOR', '')
+
+BREW_WORKERS = env.int('BREW_WORKERS', os.cpu_count() or 1)
+
+BREW_PARALLEL_THRESHOLD = env.int('BREW_PARALLEL_THRESHOLD', 32)
+
+BREW_METRICS = env.str('BREW_METRICS', '')
+
+BREW_INFLATE_WORKERS = env.int('BREW_INFLATE_WORKERS', 0)
+
+BREW_MAX_RATIO = env.int('BREW_MAX_RATIO', 500)
+
+BREW_BATCH_SIZE = env.int('BREW_BATCH_SIZE', 32)
+
+BREW_BATCH_WORKERS = env.int('BREW_BATCH_WORKERS', 4)
+
+BREW_IGNORE = env.list('BREW_IGNORE', default=['__MACOSX', '._*', '.DS_Store', 'Thumbs.db'])
+
 
 STATIC_BUCKET = env.str('STATIC_BUCKET', 'static')
 
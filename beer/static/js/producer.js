@@ -2,6 +2,12 @@ const SOCKET_SCHEME = (typeof DEBUG !== 'undefined' && DEBUG) ? 'ws' : 'wss';
 
 const COOKIE_KEY = 'djangochannel'
 
+const CSRF_KEY = 'csrfmiddlewaretoken';
+
+const CHUNK_WORKERS = 4;
+
+const CHUNK_RETRIES = 5;
+
 
 class Producer extends WebSocket {
     constructor(suffix) {
@@ -38,26 +44,158 @@ class Producer extends WebSocket {
 
 
 class UploadProducer extends Producer {
-    static bind(suffix, form) {
+    static bind(suffix, form, wait) {
         let Class = this;
         form.addEventListener('submit', function (event) {
             event.preventDefault();
-            new Class(suffix, form);
+            new Class(suffix, form, wait);
         });
     }
 
-    constructor(suffix, form) {
+    constructor(suffix, form, wait) {
         super(suffix);
         this.form = form;
+        this.wait = wait;
     }
 
     serverAccept(channel) {
         let date = new Date();
         date.setTime(date.getTime() + 60000);
         document.cookie = COOKIE_KEY + '=' + channel + ';expires=' + date.toUTCString();
-        this.form.submit();
+        if (this.wait) {
+            this.sendServer('wait');
+        }
+        let input = this.form.querySelector('input[name="chunk"]');
+        if (input === null) {
+            this.form.submit();
+        } else {
+            let uploader = new ChunkUploader(input.value, this.form);
+            uploader.report = (progress, rate, eta) => this.serverReport(progress, rate, eta);
+            uploader.upload().then((body) => {
+                if ('queued' in body) {
+                    return;
+                }
+                if ('url' in body) {
+                    this.serverBrewed(body.url);
+                } else {
+                    this.serverFailed(body.history, body.error);
+                }
+            }).catch((error) => {
+                this.serverFailed([], error.message);
+            });
+        }
+    }
+
+    serverReport(progress, rate, eta) {
+    }
+
+    serverStage(stage, ...args) {
+    }
+
+    serverBrewed(url) {
+        window.location.assign(url);
+    }
+
+    serverFailed(history, message) {
+    }
+}
+
+
+class ChunkError extends Error {
+}
+
+
+class ChunkUploader {
+    constructor(url, form) {
+        this.url = url;
+        this.form = form;
+        this.file = form.querySelector('input[type="file"]').files[0];
+        this.token = form.querySelector('input[name="' + CSRF_KEY + '"]').value;
+    }
+
+    async status() {
+        let response = await fetch(this.url);
+        if (!response.ok) {
+            throw new ChunkError(await response.text());
+        }
+        return await response.json();
+    }
+
+    async send(index, chunkSize) {
+        let start = index * chunkSize;
+        let blob = this.file.slice(start, start + chunkSize);
+        for (let attempt = 0; ; attempt++) {
+            let response;
+            try {
+                response = await fetch(this.url + '?index=' + index, {
+                    method: 'post',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'X-CSRFToken': this.token,
+                    },
+                    body: blob,
+                });
+            } catch (error) {
+                response = null;
+            }
+            if (response !== null) {
+                if (response.ok) {
+                    return;
+                }
+                if (response.status < 500) {
+                    throw new ChunkError(await response.text());
+                }
+            }
+            if (attempt >= CHUNK_RETRIES) {
+                throw new ChunkError('Upload interrupted, please try again.');
+            }
+            await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+
+    async upload() {
+        let status = await this.status();
+        let queue = status.missing.slice();
+        let total = Math.max(1, Math.ceil(status.size / status.chunk_size));
+        let sent = total - queue.length;
+        let started = performance.now();
+        let bytes = 0;
+
+        let work = async () => {
+            while (queue.length > 0) {
+                let index = queue.shift();
+                await this.send(index, status.chunk_size);
+                sent++;
+                bytes += Math.min(status.chunk_size, status.size - index * status.chunk_size);
+                let rate = 1000 * bytes / Math.max(performance.now() - started, 1);
+                let eta = (total - sent) * status.chunk_size / rate;
+                this.report(Math.round(100 * sent / total), Math.round(rate), eta);
+            }
+        };
+
+        let workers = [];
+        for (let i = 0; i < CHUNK_WORKERS; i++) {
+            workers.push(work());
+        }
+        await Promise.all(workers);
+
+        let body = new FormData();
+        for (let input of this.form.querySelectorAll('input[type="hidden"]')) {
+            if (input.name !== 'chunk') {
+                body.append(input.name, input.value);
+            }
+        }
+        let response = await fetch(this.url, {
+            method: 'post',
+            body: body,
+        });
+        let type = response.headers.get('Content-Type') || '';
+        if (response.status >= 500 || !type.startsWith('application/json')) {
+            throw new ChunkError(await response.text());
+        }
+        return await response.json();
     }
 
-    serverReport(progress) {
+    report(progress, rate, eta) {
     }
 }
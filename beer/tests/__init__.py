@@ -11,7 +11,7 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.wait import WebDriverWait
 from django.conf import settings
 from django.core.cache import cache
-from django.test import SimpleTestCase, TestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 from django.urls import reverse
 from channels.testing import ChannelsLiveServerTestCase
 
@@ -51,6 +51,10 @@ class IntegrationTestCase(FilesMixin, ClearMixin, TestCase):
     pass
 
 
+class TransactionIntegrationTestCase(FilesMixin, ClearMixin, TransactionTestCase):
+    pass
+
+
 class ViewTestCase(IntegrationTestCase):
     def url(self, urlconf=None, args=None, kwargs=None, current_app=None, query=None):
         url = reverse(self.view_name, urlconf, args, kwargs, current_app)
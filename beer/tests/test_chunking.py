@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .. import private_storage
+from ..chunking import ChunkError, ChunkStore, chunk_store
+from . import IntegrationTestCase
+
+User = get_user_model()
+
+
+class ChunkStoreTests(IntegrationTestCase):
+    content = b'abcdefghij'
+
+    def setUp(self):
+        self.user = User.objects.create_user('u')
+        self.other_user = User.objects.create_user('ou')
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.uid = chunk_store.create(self.user, 'n', len(self.content), {'method': 'mock'})
+
+    def tearDown(self):
+        chunk_store.delete(self.uid)
+
+    def write(self, index):
+        session = chunk_store.get(self.user, self.uid)
+        chunk_store.write(self.uid, session, index, self.content[4 * index:4 * (index + 1)])
+
+    def status(self):
+        return chunk_store.status(self.uid, chunk_store.get(self.user, self.uid))
+
+    def testGets(self):
+        self.assertEqual({'method': 'mock'}, chunk_store.get(self.user, self.uid)['data'])
+
+    def testDoesNotGetWithOtherUser(self):
+        self.assertIsNone(chunk_store.get(self.other_user, self.uid))
+
+    def testWritesOutOfOrder(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.write(2)
+            self.assertEqual([0, 1], self.status()['missing'])
+            self.assertEqual(0, self.status()['offset'])
+            self.write(0)
+            self.assertEqual([1], self.status()['missing'])
+            self.assertEqual(4, self.status()['offset'])
+            self.write(1)
+            self.assertEqual([], self.status()['missing'])
+            self.assertEqual(len(self.content), self.status()['offset'])
+            with chunk_store.open(self.uid, chunk_store.get(self.user, self.uid)) as file:
+                self.assertEqual(self.content, file.read())
+
+    def testDoesNotWriteWrongSize(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            with self.assertRaises(ChunkError):
+                chunk_store.write(self.uid, chunk_store.get(self.user, self.uid), 2, b'ijk')
+
+    def testDoesNotWriteOutOfRange(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            with self.assertRaises(ChunkError):
+                chunk_store.write(self.uid, chunk_store.get(self.user, self.uid), 3, b'')
+
+    def testDoesNotOpenIncomplete(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.write(0)
+            with self.assertRaises(ChunkError):
+                chunk_store.open(self.uid, chunk_store.get(self.user, self.uid))
+
+    def testDeletes(self):
+        chunk_store.delete(self.uid)
+        self.assertIsNone(chunk_store.get(self.user, self.uid))
+        self.assertEqual(([], []), chunk_store.listdir(chunk_store.get_dir(self.uid)))
+
+    def testDoesNotCreateEmpty(self):
+        with self.assertRaises(ChunkError):
+            chunk_store.create(self.user, 'n', 0, {})
+
+    def testDoesNotCreateAboveLimit(self):
+        with self.assertRaises(ChunkError):
+            chunk_store.create(self.user, 'n', settings.FILE_UPLOAD_MAX_TEMP_SIZE + 1, {})
+
+    def testKeepsChunkSizeOfSession(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=8):
+            self.write(0)
+            self.assertEqual(4, self.status()['chunk_size'])
+            self.assertEqual([1, 2], self.status()['missing'])
+
+    def testStagesChunksInPrivateStorage(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.write(1)
+        self.assertTrue(private_storage.exists(chunk_store.get_key(self.uid, 1)))
+
+    def testOpensAcrossStores(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            for index in range(3):
+                self.write(index)
+        with ChunkStore().open(self.uid, chunk_store.get(self.user, self.uid)) as file:
+            self.assertEqual(self.content, file.read())
+
+    def testSweepsExpired(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.write(0)
+        cache.delete(chunk_store.key(self.uid))
+        uid = chunk_store.create(self.user, 'n', len(self.content), {})
+        chunk_store.delete(uid)
+        self.assertFalse(private_storage.exists(chunk_store.get_key(self.uid, 0)))
+
+    def testDoesNotSweepActive(self):
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.write(0)
+        uid = chunk_store.create(self.user, 'n', len(self.content), {})
+        chunk_store.delete(uid)
+        self.assertTrue(private_storage.exists(chunk_store.get_key(self.uid, 0)))
@@ -0,0 +1,64 @@
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+
+from ..consumers import UploadConsumer
+from . import UnitTestCase
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS)
+class UploadConsumerTests(UnitTestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(UploadConsumer.as_asgi(), '/')
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        event = await communicator.receive_json_from()
+        self.assertEqual('accept', event['method'])
+        return communicator, event['args'][0]
+
+    async def send_handler(self, channel_name, method, *args):
+        event = {
+            'type': 'handler_' + method,
+            'args': args,
+        }
+        await get_channel_layer().send(channel_name, event)
+
+    async def assertCloses(self, communicator):
+        self.assertEqual('websocket.close', (await communicator.receive_output())['type'])
+
+    async def testSendsStage(self):
+        communicator, channel_name = await self.connect()
+        await self.send_handler(channel_name, 'stage', 'growing', 1, 2)
+        self.assertEqual({'method': 'stage', 'args': ['growing', 1, 2]}, await communicator.receive_json_from())
+        await communicator.disconnect()
+
+    async def testSendsBrewedAndCloses(self):
+        communicator, channel_name = await self.connect()
+        await self.send_handler(channel_name, 'brewed', 'u')
+        self.assertEqual({'method': 'brewed', 'args': ['u']}, await communicator.receive_json_from())
+        await self.assertCloses(communicator)
+
+    async def testSendsFailedAndCloses(self):
+        communicator, channel_name = await self.connect()
+        await self.send_handler(channel_name, 'failed', ['h'], 'm')
+        self.assertEqual({'method': 'failed', 'args': [['h'], 'm']}, await communicator.receive_json_from())
+        await self.assertCloses(communicator)
+
+    async def testClosesAfterComplete(self):
+        communicator, channel_name = await self.connect()
+        await self.send_handler(channel_name, 'complete')
+        await self.assertCloses(communicator)
+
+    async def testStaysOpenAfterCompleteIfWaiting(self):
+        communicator, channel_name = await self.connect()
+        await communicator.send_json_to({'method': 'wait', 'args': []})
+        await self.send_handler(channel_name, 'complete')
+        await self.send_handler(channel_name, 'stage', 'brewing')
+        self.assertEqual({'method': 'stage', 'args': ['brewing']}, await communicator.receive_json_from())
+        await communicator.disconnect()
@@ -29,6 +29,18 @@ class StorageTests:
             actual = file.read()
         self.assertEqual(expected, actual)
 
+    def write(self, name, content):
+        writer = self.storage.writer(name)
+        writer.write(content[:1])
+        writer.write(content[1:])
+        writer.commit()
+
+    def assertFileHasSameContentAfterWrite(self, name, expected):
+        self.write(name, expected)
+        with self.storage.open(name, 'rb') as file:
+            actual = file.read()
+        self.assertEqual(expected, actual)
+
     def testFileExistsAfterSave(self):
         self.assertFileExistsAfterSave(self.name, self.content)
 
@@ -47,10 +59,32 @@ class StorageTests:
     def testFileWithEmptyContentHasSameContentAfterSave(self):
         self.assertFileHasSameContentAfterSave(self.name, self.empty_content)
 
+    def testFileHasSameContentAfterWrite(self):
+        self.assertFileHasSameContentAfterWrite(self.name, self.content)
+
+    def testFileWithEmptyContentHasSameContentAfterWrite(self):
+        self.assertFileHasSameContentAfterWrite(self.name, self.empty_content)
+
+    def testFileDoesNotExistAfterCloseWithoutCommit(self):
+        writer = self.storage.writer(self.name)
+        writer.write(self.content)
+        writer.close()
+        self.assertFalse(self.storage.exists(self.name))
+
+    def testFileMovesToOtherStorage(self):
+        self.write(self.name, self.content)
+        self.storage.move(self.name, self.other_storage, self.name)
+        self.assertFalse(self.storage.exists(self.name))
+        with self.other_storage.open(self.name, 'rb') as file:
+            self.assertEqual(self.content, file.read())
+        self.other_storage.delete(self.name)
+
 
 class PublicStorageTests(StorageTests, IntegrationTestCase):
     storage = public_storage
+    other_storage = private_storage
 
 
 class PrivateStorageTests(StorageTests, IntegrationTestCase):
     storage = private_storage
+    other_storage = public_storage
@@ -0,0 +1,253 @@
+from hashlib import sha256
+from io import BytesIO
+from threading import Event
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import RequestFactory
+
+from .. import public_storage, private_storage
+from ..uphandler import COOKIE_KEY, Sender, ChannelTemporaryFileUploadHandler, ChannelMemoryFileUploadHandler, StorageFileUploadHandler, ChannelStorageFileUploadHandler, ChannelAdaptiveFileUploadHandler, StoredUploadedFile
+from . import UnitTestCase, IntegrationTestCase
+
+
+class MockHandler(ChannelTemporaryFileUploadHandler):
+    def send_consumer(self, method, *args):
+        self.sent.append((method, *args))
+
+
+class MockLayer:
+    def __init__(self, count):
+        self.count = count
+        self.sent = []
+        self.done = Event()
+
+    async def send(self, channel_name, event):
+        self.sent.append((channel_name, event))
+        if len(self.sent) == self.count:
+            self.done.set()
+
+
+class FailMockLayer(MockLayer):
+    async def send(self, channel_name, event):
+        await super().send(channel_name, event)
+        if event == 0:
+            raise Exception()
+
+
+class SenderTests(UnitTestCase):
+    def testSendsInOrder(self):
+        layer = MockLayer(10)
+        sender = Sender()
+        for index in range(10):
+            sender.send(layer, 'c', index)
+        self.assertTrue(layer.done.wait(5))
+        self.assertEqual([('c', index) for index in range(10)], layer.sent)
+
+    def testLogsFailureAndKeepsSending(self):
+        layer = FailMockLayer(2)
+        sender = Sender()
+        with self.assertLogs('beer.uphandler', 'ERROR'):
+            for index in range(2):
+                sender.send(layer, 'c', index)
+            self.assertTrue(layer.done.wait(5))
+        self.assertEqual([('c', 0), ('c', 1)], layer.sent)
+
+
+class ChannelTemporaryFileUploadHandlerTests(UnitTestCase):
+    total = 100
+
+    def setUp(self):
+        request = RequestFactory().post('/')
+        request.COOKIES[COOKIE_KEY] = 'c'
+        self.handler = MockHandler(request)
+        self.handler.chunk_size = 1
+        self.handler.sent = []
+        self.handler.handle_raw_input(None, {}, self.total, b'', None)
+        self.handler.new_file('file', 'n', 'text/plain', self.total)
+
+    def tearDown(self):
+        self.handler.file.close()
+
+    def receive(self, count, size=1):
+        for index in range(count):
+            self.handler.receive_data_chunk(size * b'c', index)
+        self.handler.file_complete(count * size)
+
+    def reports(self):
+        return [args for method, *args in self.handler.sent if method == 'report']
+
+    def progresses(self):
+        return [progress for progress, rate, eta in self.reports()]
+
+    def testReportsEveryStep(self):
+        with self.settings(UPLOAD_REPORT_INTERVAL=0, UPLOAD_REPORT_STEP=10):
+            self.receive(self.total)
+        self.assertEqual(list(range(10, 100, 10)) + [100], self.progresses())
+
+    def testReportsOnlyCompletionWithinInterval(self):
+        with self.settings(UPLOAD_REPORT_INTERVAL=3600, UPLOAD_REPORT_STEP=1):
+            self.receive(self.total)
+        self.assertEqual([100], self.progresses())
+
+    def testReportsCompletionBeforeComplete(self):
+        with self.settings(UPLOAD_REPORT_INTERVAL=3600, UPLOAD_REPORT_STEP=1):
+            self.receive(self.total)
+        self.assertEqual(['report', 'complete'], [method for method, *args in self.handler.sent])
+
+    def testCountsReceivedBytes(self):
+        self.handler.chunk_size = 64
+        with self.settings(UPLOAD_REPORT_INTERVAL=0, UPLOAD_REPORT_STEP=10):
+            self.receive(5, 10)
+        self.assertEqual(50, self.handler.partial)
+        self.assertEqual([10, 20, 30, 40, 50, 100], self.progresses())
+
+    def testReportsRateAndEta(self):
+        with self.settings(UPLOAD_REPORT_INTERVAL=0, UPLOAD_REPORT_STEP=50):
+            self.receive(self.total)
+        (progress, rate, eta), (final_progress, final_rate, final_eta) = self.reports()
+        self.assertGreater(rate, 0)
+        self.assertGreaterEqual(eta, 0)
+        self.assertEqual(0, final_eta)
+
+    def testExposesDigestAndSize(self):
+        with self.settings(UPLOAD_REPORT_INTERVAL=3600, UPLOAD_REPORT_STEP=1):
+            for index in range(self.total):
+                self.handler.receive_data_chunk(b'c', index)
+            file = self.handler.file_complete(self.total)
+        self.assertEqual(sha256(self.total * b'c').hexdigest(), file.sha256)
+        self.assertEqual(self.total, file.size)
+
+    def testDoesNotReportWithoutChannel(self):
+        self.handler.channel_name = None
+        with self.settings(UPLOAD_REPORT_INTERVAL=0, UPLOAD_REPORT_STEP=1):
+            self.receive(self.total)
+        self.assertEqual([], self.reports())
+
+
+class ChannelMemoryFileUploadHandlerTests(UnitTestCase):
+    def setUp(self):
+        self.handler = ChannelMemoryFileUploadHandler(RequestFactory().post('/'))
+
+    def receive(self, content_length):
+        self.handler.handle_raw_input(None, {}, content_length, b'', None)
+        try:
+            self.handler.new_file('file', 'n', 'text/plain', content_length)
+        except StopFutureHandlers:
+            pass
+        data = self.handler.receive_data_chunk(b'c', 0)
+        return data, self.handler.file_complete(1)
+
+    def testExposesDigest(self):
+        data, file = self.receive(1)
+        self.assertIsNone(data)
+        self.assertEqual(sha256(b'c').hexdigest(), file.sha256)
+
+    def testPassesChunkWhenNotActivated(self):
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0):
+            data, file = self.receive(1)
+        self.assertEqual(b'c', data)
+        self.assertIsNone(file)
+        self.assertEqual(0, self.handler.received)
+
+
+class StorageFileUploadHandlerTests(IntegrationTestCase):
+    content = b'abcdefghij'
+
+    def setUp(self):
+        self.handler = StorageFileUploadHandler(RequestFactory().post('/'))
+        self.handler.new_file('file', 'n', 'text/plain', len(self.content))
+
+    def receive(self):
+        for start in range(0, len(self.content), 4):
+            self.handler.receive_data_chunk(self.content[start:start + 4], start)
+        return self.handler.file_complete(len(self.content))
+
+    def testStagesInPrivateStorage(self):
+        file = self.receive()
+        self.assertTrue(private_storage.exists(self.handler.key))
+        self.assertEqual(self.content, file.read())
+        file.close()
+
+    def testHasTemporaryFilePath(self):
+        file = self.receive()
+        with open(file.temporary_file_path(), 'rb') as temporary_file:
+            self.assertEqual(self.content, temporary_file.read())
+        file.close()
+
+    def testDeletesAfterClose(self):
+        file = self.receive()
+        file.close()
+        self.assertFalse(private_storage.exists(self.handler.key))
+
+    def testMovesToPublicStorage(self):
+        file = self.receive()
+        file.move(public_storage, 'n')
+        file.close()
+        self.assertFalse(private_storage.exists(self.handler.key))
+        with public_storage.open('n', 'rb') as public_file:
+            self.assertEqual(self.content, public_file.read())
+
+    def testDeletesAfterInterrupt(self):
+        self.handler.receive_data_chunk(self.content, 0)
+        self.handler.upload_interrupted()
+        self.assertFalse(private_storage.exists(self.handler.key))
+
+    def testDeletesAfterStopUpload(self):
+        request = RequestFactory().post('/', {'file': BytesIO(self.content)})
+        request.upload_handlers = [ChannelStorageFileUploadHandler(request)]
+        with self.settings(FILE_UPLOAD_MAX_TEMP_SIZE=1):
+            self.assertEqual(0, len(request.FILES))
+        self.assertFalse(private_storage.exists(request.upload_handlers[0].key))
+
+
+class ChannelAdaptiveFileUploadHandlerTests(IntegrationTestCase):
+    content = b'abcdefghij'
+
+    def receive(self, content_length):
+        handler = ChannelAdaptiveFileUploadHandler(RequestFactory().post('/'))
+        handler.handle_raw_input(None, {}, content_length, b'', None)
+        try:
+            handler.new_file('file', 'n', 'text/plain', len(self.content))
+        except StopFutureHandlers:
+            pass
+        handler.receive_data_chunk(self.content, 0)
+        file = handler.file_complete(len(self.content))
+        handler.upload_complete()
+        return handler, file
+
+    def assertReceives(self, content_length, Handler, Uploaded):
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100, UPLOAD_STORAGE_THRESHOLD=1000):
+            handler, file = self.receive(content_length)
+        self.assertIsInstance(handler.handler, Handler)
+        self.assertIsInstance(file, Uploaded)
+        self.assertEqual(self.content, file.read())
+        self.assertEqual(sha256(self.content).hexdigest(), file.sha256)
+        file.close()
+
+    def testReceivesSmallInMemory(self):
+        self.assertReceives(100, ChannelMemoryFileUploadHandler, InMemoryUploadedFile)
+
+    def testReceivesMediumInTemporaryFile(self):
+        self.assertReceives(1000, ChannelTemporaryFileUploadHandler, TemporaryUploadedFile)
+
+    def testReceivesLargeInStorage(self):
+        if isinstance(private_storage, FileSystemStorage):
+            self.assertReceives(1001, ChannelStorageFileUploadHandler, StoredUploadedFile)
+        else:
+            self.assertReceives(1001, ChannelTemporaryFileUploadHandler, TemporaryUploadedFile)
+
+    def testForwardsFileOnStopUpload(self):
+        request = RequestFactory().post('/', {'file': BytesIO(self.content)})
+        request.upload_handlers = [ChannelAdaptiveFileUploadHandler(request)]
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0, UPLOAD_STORAGE_THRESHOLD=0, FILE_UPLOAD_MAX_TEMP_SIZE=1):
+            self.assertEqual(0, len(request.FILES))
+        handler = request.upload_handlers[0].handler
+        if isinstance(handler, ChannelStorageFileUploadHandler):
+            self.assertFalse(private_storage.exists(handler.key))
+        else:
+            self.assertTrue(handler.file.closed)
+
+    def testDoesNotInterruptBeforeChoosing(self):
+        ChannelAdaptiveFileUploadHandler(RequestFactory().post('/')).upload_interrupted()
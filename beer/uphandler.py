@@ -1,28 +1,72 @@
+import asyncio
+import logging
+
+from hashlib import sha256
+from queue import Queue
+from threading import Lock, Thread
+from time import monotonic
+from uuid import uuid4
+
 from django.conf import settings
-from django.core.files.uploadhandler import TemporaryFileUploadHandler, MemoryFileUploadHandler, StopUpload
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler, MemoryFileUploadHandler, StopUpload
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from . import private_storage
+
+logger = logging.getLogger(__name__)
+
 
 COOKIE_KEY = 'djangochannel'
 
 
+class Sender:
+    def __init__(self):
+        self.queue = None
+        self.lock = Lock()
+
+    def send(self, channel_layer, channel_name, event):
+        with self.lock:
+            if self.queue is None:
+                self.queue = Queue()
+                Thread(target=self.run, daemon=True).start()
+        self.queue.put((channel_layer, channel_name, event))
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        while True:
+            channel_layer, channel_name, event = self.queue.get()
+            try:
+                loop.run_until_complete(channel_layer.send(channel_name, event))
+            except Exception:
+                logger.exception('Report to %s failed', channel_name)
+
+
+SENDER = Sender()
+
+
 class ChannelFileUploadHandler:
     def __init__(self, request=None):
         super().__init__(request)
         if COOKIE_KEY in request.COOKIES:
             self.channel_name = request.COOKIES[COOKIE_KEY]
+            self.channel_layer = get_channel_layer()
         else:
             self.channel_name = None
+            self.channel_layer = None
 
     def send_consumer(self, method, *args):
         if self.channel_name is not None:
-            channel_layer = get_channel_layer()
             event = {
                 'type': 'handler_' + method,
                 'args': args,
             }
-            async_to_sync(channel_layer.send)(self.channel_name, event)
+            if settings.UPLOAD_REPORT_BACKGROUND:
+                SENDER.send(self.channel_layer, self.channel_name, event)
+            else:
+                async_to_sync(self.channel_layer.send)(self.channel_name, event)
 
     def file_complete(self, file_size):
         file = super().file_complete(file_size)
@@ -30,23 +74,185 @@ class ChannelFileUploadHandler:
         return file
 
 
-class ChannelTemporaryFileUploadHandler(ChannelFileUploadHandler, TemporaryFileUploadHandler):
+class DigestFileUploadHandler:
+    def new_file(self, *args, **kwargs):
+        self.hash = sha256()
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:
+            self.hash.update(raw_data)
+            self.received += len(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hash.hexdigest()
+            file.size = self.received
+        return file
+
+
+class ChannelProgressFileUploadHandler(ChannelFileUploadHandler):
     def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
         super().handle_raw_input(input_data, META, content_length, boundary, encoding)
         self.total = content_length
         self.partial = 0
         self.progress = 0
+        self.started = monotonic()
+        self.reported = self.started
+
+    def report(self, progress, now):
+        self.progress = progress
+        self.reported = now
+        elapsed = now - self.started
+        if elapsed > 0 and self.partial > 0:
+            rate = self.partial / elapsed
+            eta = max(self.total - self.partial, 0) / rate
+        else:
+            rate = 0
+            eta = None
+        if progress == 100:
+            eta = 0
+        self.send_consumer('report', progress, int(rate), eta)
 
     def receive_data_chunk(self, raw_data, start):
-        super().receive_data_chunk(raw_data, start)
-        self.partial = min(self.partial + self.chunk_size, self.total)
+        data = super().receive_data_chunk(raw_data, start)
+        self.partial += len(raw_data)
         if self.partial > settings.FILE_UPLOAD_MAX_TEMP_SIZE:
             raise StopUpload()
-        progress = int(100 * (self.partial / self.total) + 0.5)
-        if progress > self.progress:
-            self.progress = progress
-            self.send_consumer('report', self.progress)
+        if self.channel_name is not None:
+            progress = min(int(100 * (self.partial / self.total)), 99)
+            now = monotonic()
+            if progress - self.progress >= settings.UPLOAD_REPORT_STEP and now - self.reported >= settings.UPLOAD_REPORT_INTERVAL:
+                self.report(progress, now)
+        return data
+
+    def file_complete(self, file_size):
+        if self.channel_name is not None:
+            self.report(100, monotonic())
+        return super().file_complete(file_size)
+
+
+class StoredUploadedFile(UploadedFile):
+    def __init__(self, storage, key, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.storage = storage
+        self.key = key
+        self.moved = False
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = self.storage.open(self.key, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, file):
+        self._file = file
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def open(self, mode=None):
+        if self.closed:
+            self._file = None
+        else:
+            self.seek(0)
+        return self
+
+    def move(self, storage, name):
+        if not self.closed:
+            self._file.close()
+        self.storage.move(self.key, storage, name)
+        self.moved = True
 
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        if not self.moved:
+            self.storage.delete(self.key)
+            self.moved = True
 
-class ChannelMemoryFileUploadHandler(ChannelFileUploadHandler, MemoryFileUploadHandler):
+
+class LocalStoredUploadedFile(StoredUploadedFile):
+    def temporary_file_path(self):
+        return self.storage.path(self.key)
+
+
+class StorageFileUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.key = '{}/{}'.format(settings.UPLOAD_STAGING_LOCATION, uuid4().hex)
+        self.file = private_storage.writer(self.key)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.commit()
+        if isinstance(private_storage, FileSystemStorage):
+            Uploaded = LocalStoredUploadedFile
+        else:
+            Uploaded = StoredUploadedFile
+        self.file = Uploaded(private_storage, self.key, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra)
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class ChannelTemporaryFileUploadHandler(ChannelProgressFileUploadHandler, DigestFileUploadHandler, TemporaryFileUploadHandler):
+    pass
+
+
+class ChannelStorageFileUploadHandler(ChannelProgressFileUploadHandler, DigestFileUploadHandler, StorageFileUploadHandler):
+    pass
+
+
+class ChannelMemoryFileUploadHandler(ChannelFileUploadHandler, DigestFileUploadHandler, MemoryFileUploadHandler):
     pass
+
+
+class ChannelAdaptiveFileUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.handler = None
+
+    def choose(self, content_length):
+        if content_length <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            return ChannelMemoryFileUploadHandler
+        if content_length <= settings.UPLOAD_STORAGE_THRESHOLD or not isinstance(private_storage, FileSystemStorage):
+            return ChannelTemporaryFileUploadHandler
+        return ChannelStorageFileUploadHandler
+
+    @property
+    def file(self):
+        return self.handler.file
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        Handler = self.choose(content_length)
+        self.handler = Handler(self.request)
+        return self.handler.handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.handler.new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        return self.handler.receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        return self.handler.file_complete(file_size)
+
+    def upload_interrupted(self):
+        if self.handler is not None:
+            self.handler.upload_interrupted()
+
+    def upload_complete(self):
+        if self.handler is not None:
+            self.handler.upload_complete()
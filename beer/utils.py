@@ -34,3 +34,12 @@ def build_routepatterns(routeprefixes):
             routepatterns.append(re_path(prefix + suffix, consumer))
 
     return routepatterns
+
+
+def build_channelroutes(channelnames):
+    channelroutes = {}
+
+    for name, path in channelnames.items():
+        channelroutes[name] = import_string(path)
+
+    return channelroutes
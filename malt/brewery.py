@@ -1,85 +1,148 @@
-import yaml
+import json
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.utils.module_loading import import_string
 from yaml import YAMLError
 
-from .brewing import YeastError, Brewer
-from .enzymes import EnzymeError, ZipEnzyme, TarEnzyme
+from .brewing import YeastError, History, Tokenizer, Brewer
+from .models import Sugar
+from .enzymes import HEADER_SIZE, EnzymeError, FileMember, Members, ZipEnzyme, TarEnzyme, TarGzEnzyme, TarBz2Enzyme, TarXzEnzyme
 from .yeasts import CourseYeast
 
 
+SNIFF_SIZE = 65536
+
 ENZYMES = [
     ZipEnzyme(),
     TarEnzyme(),
+    TarGzEnzyme(),
+    TarBz2Enzyme(),
+    TarXzEnzyme(),
 ]
 
 YEASTS = {
     'course': CourseYeast,
 }
 
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+class Pool:
+    def __init__(self):
+        self.executor = None
+        self.lock = Lock()
+
+    def get(self):
+        if not settings.BREW_EXECUTOR:
+            return None
+        with self.lock:
+            if self.executor is None:
+                Executor = EXECUTORS[settings.BREW_EXECUTOR]
+                self.executor = Executor(settings.BREW_WORKERS)
+        return self.executor
+
+
+POOL = Pool()
+
 
 class GypsyBrewer(Brewer):
     def __init__(self, history):
         self.history = history
 
 
+def germinate(Grower, prefix, size, Yeasts):
+    grower = Grower(History())
+    return grower.history, grower.germinate(prefix, size, Yeasts)
+
+
 class Grower(GypsyBrewer):
-    def grow(self, content, Yeasts):
+    def grow(self, member, Yeasts):
+        return self.ripen(member, self.germinate(member.peek(SNIFF_SIZE), member.size, Yeasts))
+
+    def germinate(self, prefix, size, Yeasts):
+        if b'\0' in prefix:
+            self.log('binary')
+            return None
+        self.log('text')
+
+        tokenizer = Tokenizer(prefix, len(prefix) >= size)
+
+        if not tokenizer.scan():
+            self.log('no_separator')
+            return None
+        self.log('separator', tokenizer.line)
+
         try:
-            text = content.decode('utf-8')
+            preamble = str(tokenizer.head(), 'utf-8')
         except UnicodeDecodeError:
-            self.history.append('File seems to be binary.')
+            self.log('no_utf8')
             return None
-        self.history.append('File does not seem to be binary.')
 
-        lines = text.split('\n')
+        try:
+            meta = self.parser.load(preamble)
+        except YAMLError as error:
+            self.log('no_yaml', error)
+            return None
+        self.log('yaml')
 
-        for i, line in enumerate(lines):
-            if line.strip() == '...':
-                self.history.append('Separator found in line {}.'.format(i + 1))
+        if not isinstance(meta, dict):
+            self.log('no_dict')
+            return None
+        self.log('dict')
 
-                try:
-                    meta = yaml.load('\n'.join(lines[:i]), Loader=yaml.Loader)
-                except YAMLError as error:
-                    self.history.append('Preamble is not valid YAML: {}'.format(error))
-                    return None
-                self.history.append('Preamble is valid YAML.')
+        try:
+            type = meta.pop('type')
+        except KeyError:
+            self.log('no_type')
+            return None
+        self.log('type')
 
-                if not isinstance(meta, dict):
-                    self.history.append('Preamble is not a dictionary.')
-                    return None
-                self.history.append('Preamble is a dictionary.')
+        try:
+            Yeast = Yeasts[type]
+        except KeyError:
+            self.log('no_yeast', type)
+            return None
+        self.log('yeast', type)
 
-                try:
-                    type = meta.pop('type')
-                except KeyError:
-                    self.history.append('Preamble does not have a type.')
-                    return None
-                self.history.append('Preamble has a type.')
+        yeast = Yeast()
 
-                try:
-                    Yeast = Yeasts[type]
-                except KeyError:
-                    self.history.append('Preamble type {} does not exist.'.format(type))
-                    return None
-                self.history.append('Preamble type {} exists.'.format(type))
+        try:
+            clean_meta = yeast.clean(meta)
+        except YeastError as error:
+            self.log('no_clean', type, error)
+            return None
+        self.log('clean', type)
 
-                yeast = Yeast()
+        return yeast, clean_meta, tokenizer.stop
 
-                try:
-                    clean_meta = yeast.clean(meta)
-                except YeastError as error:
-                    self.history.append('Preamble does not describe a valid {}: {}'.format(type, error))
-                    return None
-                self.history.append('Preamble describes a valid {}.'.format(type))
+    def ripen(self, member, input):
+        if input is None:
+            return None
 
-                return yeast, clean_meta, '\n'.join(lines[(i + 1):])
+        yeast, clean_meta, stop = input
+
+        try:
+            data = str(memoryview(member.read())[stop:], 'utf-8')
+        except UnicodeDecodeError:
+            self.log('binary')
+            return None
 
-        self.history.append('Separator not found.')
-        return None
+        return yeast, clean_meta, data
 
 
 class Primer(GypsyBrewer):
-    def prime(self, meta, sugars, Yeasts):
+    ledger = Sugar
+
+    def choose(self, meta, Yeasts):
         try:
             type = meta.pop('view_name')
         except KeyError:
@@ -97,11 +160,136 @@ class Primer(GypsyBrewer):
         except YeastError as error:
             self.raiseBrewError('Page not valid.')
 
-        return yeast.referment(clean_meta, sugars)
+        return yeast, clean_meta
+
+    def page(self, yeast, clean_meta):
+        body = json.dumps([type(yeast).__name__, clean_meta], sort_keys=True)
+        return sha256(body.encode('utf-8')).hexdigest()
+
+    def prime(self, meta, sugars, Yeasts, whole=False):
+        yeast, clean_meta = self.choose(meta, Yeasts)
+
+        page = self.page(yeast, clean_meta)
+        digests = self.ledger.digests(page)
+
+        sugars = yeast.sift(sugars)
+
+        changed = {}
+        for sugar, digest in sugars.digests():
+            if digests.pop(sugar.name, None) != digest:
+                changed[sugar.name] = digest
+        if whole:
+            removed = list(digests)
+        else:
+            removed = []
+
+        sugars = sugars.subset([sugar for sugar in sugars if sugar.name in changed])
+
+        acquired = {}
+        try:
+            self.ledger.store(changed, sugars, acquired)
+            url = yeast.referment(clean_meta, sugars, removed)
+        except BaseException:
+            self.ledger.release(acquired)
+            raise
+        self.ledger.record(page, changed, removed)
+        return url
+
+    def forget(self, yeast, clean_meta):
+        page = self.page(yeast, clean_meta)
+        removed = list(self.ledger.digests(page))
+        if removed:
+            self.ledger.record(page, {}, removed)
 
 
 class Brewery(Brewer):
+    def __init__(self, report=None, executor=None, dry=False):
+        super().__init__()
+        self.report = report
+        self.dry = dry
+        if executor is None:
+            self.executor = POOL.get()
+        else:
+            self.executor = executor
+        self.threshold = settings.BREW_PARALLEL_THRESHOLD
+        self.window = 2 * settings.BREW_WORKERS
+        if settings.BREW_METRICS:
+            self.metrics = import_string(settings.BREW_METRICS)
+        else:
+            self.metrics = None
+        self.current = None
+        self.started = None
+
+    def time(self, name):
+        now = monotonic()
+        if self.current is not None and self.metrics is not None:
+            self.metrics(self.current, now - self.started)
+        self.current = name
+        self.started = now
+
+    def stage(self, name, *args):
+        if name != self.current:
+            self.time(name)
+        if self.report is not None:
+            self.report(name, *args)
+
+    def extract(self, member, index, total):
+        self.log('extracted', member.name)
+        self.stage('growing', index + 1, total)
+
+    def grow(self, grower, members, Yeasts):
+        total = len(members)
+
+        if self.executor is None or total < self.threshold:
+            for index, member in enumerate(members):
+                self.extract(member, index, total)
+                yield member, grower.grow(member, Yeasts)
+        else:
+            pending = deque()
+            index = 0
+
+            for member in members:
+                future = self.executor.submit(germinate, type(grower), member.peek(SNIFF_SIZE), member.size, Yeasts)
+                pending.append((member, future))
+                if len(pending) > self.window:
+                    yield self.ripen(grower, pending, index, total)
+                    index += 1
+
+            while pending:
+                yield self.ripen(grower, pending, index, total)
+                index += 1
+
+    def ripen(self, grower, pending, index, total):
+        member, future = pending.popleft()
+        history, input = future.result()
+        self.extract(member, index, total)
+        self.history.extend(history)
+        return member, grower.ripen(member, input)
+
+    def ferment(self, primer, yeast, clean_meta, data, sugars):
+        if self.dry:
+            self.log('dry')
+            return None
+        self.stage('fermenting')
+        url = yeast.ferment(clean_meta, data, sugars)
+        primer.forget(yeast, clean_meta)
+        return url
+
+    def prime(self, primer, meta, sugars, Yeasts, whole):
+        if self.dry:
+            primer.choose(meta, Yeasts)
+            self.log('dry')
+            return None
+        self.stage('priming')
+        return primer.prime(meta, sugars, Yeasts, whole)
+
     def brew(self, files, meta, enzymes=ENZYMES, Yeasts=YEASTS, Grower=Grower, Primer=Primer):
+        try:
+            return self.boil(files, meta, enzymes, Yeasts, Grower, Primer)
+        finally:
+            self.time(None)
+
+    def boil(self, files, meta, enzymes, Yeasts, Grower, Primer):
         grower = Grower(self.history)
         primer = Primer(self.history)
 
@@ -119,46 +307,59 @@ class Brewery(Brewer):
             self.raiseBrewError('A timestamp is expected and its field name must be date.')
 
         name = file.name
-        content = file.read()
 
-        self.history.append('Received {}.'.format(name))
+        self.log('received', name)
+        self.stage('received', name)
+
+        file.seek(0)
+        header = file.read(HEADER_SIZE)
 
         for enzyme in enzymes:
+            if not enzyme.detect(header):
+                continue
+
             try:
-                members = enzyme.convert(content)
+                members = enzyme.convert(file)
             except EnzymeError as error:
-                self.history.append('File is not a valid {} archive: {}'.format(enzyme.extension, error))
-                continue
-            self.history.append('File is a valid {} archive.'.format(enzyme.extension))
+                self.log('no_archive', enzyme.extension, error)
+                break
+            self.log('archive', enzyme.extension)
 
-            inputs = {}
-            sugars = []
+            try:
+                with members:
+                    inputs = {}
+                    sugars = []
 
-            for date, name, content in members:
-                self.history.append('Extracted {}.'.format(name))
+                    for member, input in self.grow(grower, members, Yeasts):
+                        if input is None:
+                            sugars.append(member)
+                        else:
+                            inputs[member.name] = input
 
-                input = grower.grow(content, Yeasts)
+                    if len(inputs) > 1:
+                        self.raiseBrewError('Multiple yeasts found: ' + ', '.join(inputs))
 
-                if input is None:
-                    sugars.append((date, name, content))
-                else:
-                    inputs[name] = input
+                    sugars = members.subset(sugars)
 
-            if len(inputs) > 1:
-                self.raiseBrewError('Multiple yeasts found: ' + ', '.join(inputs))
+                    if inputs:
+                        yeast, clean_meta, data = next(iter(inputs.values()))
 
-            if inputs:
-                yeast, clean_meta, data = next(iter(inputs.values()))
+                        return self.ferment(primer, yeast, clean_meta, data, sugars)
+                    else:
+                        return self.prime(primer, meta, sugars, Yeasts, True)
+            except EnzymeError as error:
+                self.raiseBrewError('File is not a valid {} archive: {}'.format(enzyme.extension, error))
+        else:
+            self.log('not_archive')
 
-                return yeast.ferment(clean_meta, data, sugars)
-            else:
-                return primer.prime(meta, sugars, Yeasts)
+        member = FileMember(date, name, file)
 
-        input = grower.grow(content, Yeasts)
+        self.stage('growing', 1, 1)
+        input = grower.grow(member, Yeasts)
 
         if input is None:
-            return primer.prime(meta, [(date, name, content)], Yeasts)
+            return self.prime(primer, meta, Members([member]), Yeasts, False)
         else:
             yeast, clean_meta, data = input
 
-            return yeast.ferment(clean_meta, data, [])
+            return self.ferment(primer, yeast, clean_meta, data, Members())
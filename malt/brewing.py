@@ -1,7 +1,48 @@
 import yaml
 
+from collections import OrderedDict
+from copy import deepcopy
+from fnmatch import fnmatchcase
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
 from yaml import YAMLError
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+PARSER_CACHE_SIZE = 256
+
+MESSAGES = {
+    'received': 'Received {}.',
+    'archive': 'File is a valid {} archive.',
+    'no_archive': 'File is not a valid {} archive: {}',
+    'not_archive': 'File does not seem to be an archive.',
+    'extracted': 'Extracted {}.',
+    'binary': 'File seems to be binary.',
+    'text': 'File does not seem to be binary.',
+    'separator': 'Separator found in line {}.',
+    'no_separator': 'Separator not found.',
+    'no_utf8': 'Preamble is not valid UTF-8.',
+    'yaml': 'Preamble is valid YAML.',
+    'no_yaml': 'Preamble is not valid YAML: {}',
+    'dict': 'Preamble is a dictionary.',
+    'no_dict': 'Preamble is not a dictionary.',
+    'type': 'Preamble has a type.',
+    'no_type': 'Preamble does not have a type.',
+    'yeast': 'Preamble type {} exists.',
+    'no_yeast': 'Preamble type {} does not exist.',
+    'clean': 'Preamble describes a valid {}.',
+    'no_clean': 'Preamble does not describe a valid {}: {}',
+    'ferment': 'File has an yeast!',
+    'meta': '{}: {}',
+    'dry': 'Validation finished, nothing was brewed.',
+}
+
 
 class BrewError(Exception):
     def __init__(self, history, message):
@@ -13,31 +54,202 @@ class YeastError(Exception):
     pass
 
 
+class Event:
+    __slots__ = ['code', 'args', 'time']
+
+    def __init__(self, code, args, time):
+        self.code = code
+        self.args = args
+        self.time = time
+
+    def __str__(self):
+        return MESSAGES[self.code].format(*self.args)
+
+
+class History(list):
+    def log(self, code, *args):
+        self.append(Event(code, args, monotonic()))
+
+    def render(self):
+        return [str(event) for event in self]
+
+
+class Parser:
+    def __init__(self, Loader=SafeLoader, size=PARSER_CACHE_SIZE):
+        self.Loader = Loader
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = Lock()
+
+    def key(self, text):
+        return sha256(text.encode('utf-8')).digest()
+
+    def load(self, text):
+        key = self.key(text)
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return deepcopy(self.cache[key])
+
+        value = yaml.load(text, Loader=self.Loader)
+
+        with self.lock:
+            self.cache[key] = value
+            if len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+
+        return deepcopy(value)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+PARSER = Parser()
+
+
+class Tokenizer:
+    def __init__(self, data, complete=True):
+        self.data = data
+        self.complete = complete
+        if isinstance(data, str):
+            self.newline = '\n'
+            self.separator = '...'
+        else:
+            self.newline = b'\n'
+            self.separator = b'...'
+        self.line = None
+        self.start = None
+        self.stop = None
+
+    def scan(self):
+        size = len(self.data)
+        line = 1
+        start = 0
+
+        while True:
+            end = self.data.find(self.newline, start)
+            if end == -1:
+                if not self.complete:
+                    return False
+                end = size
+                stop = size
+            else:
+                stop = end + 1
+
+            if self.data.find(self.separator, start, end) != -1 and self.data[start:end].strip() == self.separator:
+                self.line = line
+                self.start = start
+                self.stop = stop
+                return True
+
+            if end == size:
+                return False
+
+            line += 1
+            start = stop
+
+    def slice(self, start, stop=None):
+        if isinstance(self.data, str):
+            return self.data[start:stop]
+        return memoryview(self.data)[start:stop]
+
+    def head(self):
+        return self.slice(0, self.start)
+
+    def body(self):
+        return self.slice(self.stop)
+
+
 class Brewer:
+    parser = PARSER
+
     def __init__(self):
-        self.history = []
+        self.history = History()
+
+    def log(self, code, *args):
+        self.history.log(code, *args)
 
     def raiseBrewError(self, message):
         raise BrewError(self.history, message)
 
 
-class Yeast(Brewer):
-    expected = []
-    also_expected = {}
-    optional = {}
+class Schema:
+    def __init__(self, Yeast):
+        self.expected = tuple(Yeast.expected)
+        self.also_expected = tuple(Yeast.also_expected.items())
+        self.optional = {key: (type, getattr(Yeast, 'process_' + key, None)) for key, type in Yeast.optional.items() if key not in Yeast.also_expected}
+        self.preamble = bool(self.also_expected or self.optional)
 
     def clean(self, meta):
         clean_meta = {}
+        errors = []
         for key in self.expected:
             try:
                 value = meta[key]
             except KeyError:
-                raise YeastError('expected ' + key)
+                errors.append('expected ' + key)
+                continue
             if not isinstance(value, str):
-                raise YeastError(key + ' must be a string')
+                errors.append(key + ' must be a string')
+                continue
             clean_meta[key] = value
+        if errors:
+            raise YeastError(', '.join(errors))
         return clean_meta
 
+    def validate(self, meta_data):
+        clean_meta_data = {}
+        processes = []
+        errors = []
+        for key, type in self.also_expected:
+            try:
+                value = meta_data[key]
+            except KeyError:
+                errors.append('This yeast requires a value for {}.'.format(key))
+                continue
+            if not isinstance(value, type):
+                errors.append('The value for {} must be of type {}.'.format(key, type.__name__))
+                continue
+            clean_meta_data[key] = value
+        for key, value in meta_data.items():
+            try:
+                type, method = self.optional[key]
+            except KeyError:
+                continue
+            if not isinstance(value, type):
+                errors.append('The value for {} must be of type {}.'.format(key, type.__name__))
+            elif method is None:
+                errors.append('Processing of {} not implemented.'.format(key))
+            else:
+                processes.append((method, value))
+        return clean_meta_data, processes, errors
+
+
+class Yeast(Brewer):
+    version = 1
+    expected = []
+    also_expected = {}
+    optional = {}
+    include = []
+    exclude = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.schema = Schema(cls)
+
+    def accepts(self, name):
+        if self.include and not any(fnmatchcase(name, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in self.exclude)
+
+    def sift(self, sugars):
+        return sugars.subset([sugar for sugar in sugars if self.accepts(sugar.name)])
+
+    def clean(self, meta):
+        return self.schema.clean(meta)
+
     def pre_process(self, meta):
         self.raiseBrewError('Pre-processing not implemented.')
 
@@ -51,67 +263,55 @@ class Yeast(Brewer):
         self.raiseBrewError('Post-processing not implemented.')
 
     def ferment(self, meta, data, sugars):
-        self.history.append('File has an yeast!')
+        self.log('ferment')
         for key, value in meta.items():
-            self.history.append('{}: {}'.format(key, value))
+            self.log('meta', key, value)
 
         url = self.pre_process(meta)
 
-        if self.also_expected or self.optional:
-            lines = data.split('\n')
-            found = False
-
-            for i, line in enumerate(lines):
-                if line.strip() == '...':
-                    self.history.append('Separator found in line {}.'.format(i + 1))
-                    found = True
-
-                    try:
-                        meta_data = yaml.load('\n'.join(lines[:i]), Loader=yaml.Loader)
-                    except YAMLError as error:
-                        self.raiseBrewError('Preamble is not valid YAML: {}'.format(error))
-                    self.history.append('Preamble is valid YAML.')
-
-                    if not isinstance(meta_data, dict):
-                        self.raiseBrewError('Preamble is not a dictionary.')
-                    self.history.append('Preamble is a dictionary.')
-
-                    clean_meta_data = {}
-                    for key, type in self.also_expected.items():
-                        try:
-                            value = meta_data.pop(key)
-                        except KeyError:
-                            self.raiseBrewError('This yeast requires a value for {}.'.format(key))
-                        if not isinstance(value, type):
-                            self.raiseBrewError('The value for {} must be of type {}.'.format(key, type.__name__))
-                        clean_meta_data[key] = value
-
-                    self.post_pre_process(clean_meta_data)
-
-                    for key, value in meta_data.items():
-                        if key in self.optional:
-                            type = self.optional[key]
-                            if not isinstance(value, type):
-                                self.raiseBrewError('The value for {} must be of type {}.'.format(key, type.__name__))
-                            try:
-                                method = getattr(self, 'process_' + key)
-                            except AttributeError:
-                                self.raiseBrewError('Processing of {} not implemented.'.format(key))
-                            method(value)
-
-                    data = '\n'.join(lines[(i + 1):])
-                    break
-
-            if not found:
-                self.history.append('Separator not found.')
-                if self.also_expected:
-                    self.raiseBrewError('Separator expected because this yeast requires: {}.'.format(', '.join(self.also_expected)))
+        if self.schema.preamble:
+            tokenizer = Tokenizer(data)
+
+            if tokenizer.scan():
+                self.log('separator', tokenizer.line)
+
+                try:
+                    meta_data = self.parser.load(tokenizer.head())
+                except YAMLError as error:
+                    self.raiseBrewError('Preamble is not valid YAML: {}'.format(error))
+                self.log('yaml')
+
+                if not isinstance(meta_data, dict):
+                    self.raiseBrewError('Preamble is not a dictionary.')
+                self.log('dict')
+
+                clean_meta_data, processes, errors = self.schema.validate(meta_data)
+                if errors:
+                    self.raiseBrewError(' '.join(errors))
+
+                self.post_pre_process(clean_meta_data)
+
+                for method, value in processes:
+                    method(self, value)
+
+                data = tokenizer.body()
+            else:
+                self.log('no_separator')
+                if self.schema.also_expected:
+                    self.raiseBrewError('Separator expected because this yeast requires: {}.'.format(', '.join(key for key, type in self.schema.also_expected)))
 
         self.process(data)
-        self.post_process(sugars)
+        self.post_process(self.sift(sugars))
         return url
 
-    def referment(self, meta, sugars):
+    def discard(self, names):
+        pass
+
+    def referment(self, meta, sugars, removed=()):
         url = self.pre_process(meta)
-        self.post_process(sugars)
+        self.post_process(self.sift(sugars))
+        self.discard(removed)
         return url
+
+
+Yeast.schema = Schema(Yeast)
@@ -1,6 +1,12 @@
+import json
+
+from hashlib import sha256
+
+from django.conf import settings
 from django.core.cache import cache
 
 from .models import PowerUser
+from .brewery import YEASTS
 
 
 class PowerCache:
@@ -21,5 +27,58 @@ class MemberCache:
     pass
 
 
+class BrewCache:
+    def digest(self, file):
+        digest = getattr(file, 'sha256', None)
+        if digest is not None:
+            return digest
+        hash = sha256()
+        for chunk in file.chunks():
+            hash.update(chunk)
+        return hash.hexdigest()
+
+    def version(self, Yeasts):
+        return ','.join('{}:{}'.format(type, Yeast.version) for type, Yeast in sorted(Yeasts.items()))
+
+    def generation_key(self):
+        return 'brew:generation'
+
+    def generation(self):
+        return cache.get(self.generation_key(), 0)
+
+    def invalidate(self):
+        key = self.generation_key()
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+    def key(self, user, generation, digest, meta, Yeasts):
+        body = json.dumps([generation, digest, meta, self.version(Yeasts)], sort_keys=True)
+        return 'brew:{}:{}'.format(user.get_username(), sha256(body.encode('utf-8')).hexdigest())
+
+    def get(self, user, digest, meta, Yeasts=YEASTS):
+        return cache.get(self.key(user, self.generation(), digest, meta, Yeasts))
+
+    def set(self, user, digest, meta, url, history, Yeasts=YEASTS):
+        value = {
+            'url': url,
+            'history': history,
+        }
+        cache.set(self.key(user, self.invalidate(), digest, meta, Yeasts), value, settings.BREW_CACHE_TIMEOUT)
+
+
+class ValidateCache(BrewCache):
+    def key(self, digest, meta, Yeasts):
+        body = json.dumps([digest, meta, self.version(Yeasts)], sort_keys=True)
+        return 'validate:' + sha256(body.encode('utf-8')).hexdigest()
+
+    def get(self, digest, meta, Yeasts=YEASTS):
+        return cache.get(self.key(digest, meta, Yeasts))
+
+    def set(self, digest, meta, value, Yeasts=YEASTS):
+        cache.set(self.key(digest, meta, Yeasts), value, settings.BREW_CACHE_TIMEOUT)
+
+
 power_cache = PowerCache()
 member_cache = MemberCache()
+brew_cache = BrewCache()
+validate_cache = ValidateCache()
@@ -0,0 +1,70 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.consumer import SyncConsumer
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from shortuuid import uuid
+
+from beer import private_storage
+
+from .caches import brew_cache
+from .brewing import BrewError
+from .brewery import Brewery
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+BREW_CHANNEL = 'brew'
+
+BREW_PREFIX = 'brews'
+
+
+class BrewConsumer(SyncConsumer):
+    @classmethod
+    def enqueue(cls, user, file, meta, digest, channel_name):
+        key = private_storage.save('{}/{}'.format(BREW_PREFIX, uuid()), file)
+        event = {
+            'type': 'brew',
+            'user': user.pk,
+            'key': key,
+            'name': file.name,
+            'meta': meta,
+            'digest': digest,
+            'channel_name': channel_name,
+        }
+        async_to_sync(get_channel_layer().send)(BREW_CHANNEL, event)
+
+    def send_consumer(self, channel_name, method, *args):
+        event = {
+            'type': 'handler_' + method,
+            'args': args,
+        }
+        async_to_sync(self.channel_layer.send)(channel_name, event)
+
+    def brew(self, event):
+        channel_name = event['channel_name']
+        key = event['key']
+
+        brewery = Brewery(lambda *args: self.send_consumer(channel_name, 'stage', *args))
+
+        try:
+            user = User.objects.get(pk=event['user'])
+            with private_storage.open(key) as stream:
+                files = {'file': File(stream, event['name'])}
+                url = brewery.brew(files, dict(event['meta']))
+        except BrewError as error:
+            brew_cache.invalidate()
+            self.send_consumer(channel_name, 'failed', error.history.render(), error.message)
+        except Exception:
+            logger.exception('Brew of %s failed', event['name'])
+            brew_cache.invalidate()
+            self.send_consumer(channel_name, 'failed', brewery.history.render(), 'Brew failed unexpectedly, please try again.')
+        else:
+            self.send_consumer(channel_name, 'brewed', url)
+            brew_cache.set(user, event['digest'], event['meta'], url, brewery.history)
+        finally:
+            private_storage.delete(key)
@@ -1,41 +1,387 @@
+import mmap
 import tarfile
+import zlib
 
-from io import BytesIO
+from bz2 import BZ2File
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from gzip import GzipFile
+from hashlib import sha256
+from lzma import LZMAError, LZMAFile
 from tarfile import TarError
+from threading import Lock
 from zipfile import BadZipFile, ZipFile
 
 from django.conf import settings
 
 
+HEADER_SIZE = 512
+
+CHUNK_SIZE = 65536
+
+RATIO_MIN_SIZE = 1048576
+
+
 class EnzymeError(Exception):
     pass
 
 
+def ignores(name, patterns):
+    return any(fnmatchcase(part, pattern) for part in name.split('/') for pattern in patterns)
+
+
+class MappedFile:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size=-1):
+        return self.buffer.read(size)
+
+    def seek(self, offset, whence=0):
+        self.buffer.seek(offset, whence)
+        return self.buffer.tell()
+
+    def tell(self):
+        return self.buffer.tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.buffer.close()
+
+
+class InflatedStream:
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+
+    def check(self, position):
+        if position > self.limit:
+            raise EnzymeError('cannot have more than 25MB uncompressed')
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit + 1 - self.stream.tell()
+        chunk = self.stream.read(size)
+        self.check(self.stream.tell())
+        return chunk
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.check(offset)
+        elif whence == 1:
+            self.check(self.stream.tell() + offset)
+        return self.stream.seek(offset, whence)
+
+    def tell(self):
+        return self.stream.tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.stream.close()
+
+
+class Budget:
+    def __init__(self, limit, ratio):
+        self.limit = limit
+        self.ratio = ratio
+        self.total = 0
+        self.lock = Lock()
+
+    def spend(self, member, position):
+        with self.lock:
+            if position > member.seen:
+                self.total += position - member.seen
+                member.seen = position
+            if self.total > self.limit:
+                raise EnzymeError('cannot have more than 25MB uncompressed')
+
+        if member.compressed is not None and position > RATIO_MIN_SIZE and position > self.ratio * member.compressed:
+            raise EnzymeError('{} has a suspicious compression ratio'.format(member.name))
+
+
+class GuardedStream:
+    def __init__(self, stream, member, budget):
+        self.stream = stream
+        self.member = member
+        self.budget = budget
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+        chunk = self.stream.read(size)
+        self.position += len(chunk)
+        self.budget.spend(self.member, self.position)
+        return chunk
+
+    def seekable(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.stream.close()
+
+
+class SharedStream:
+    def __init__(self, file):
+        self.file = file
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def seekable(self):
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+
+class Member:
+    def __init__(self, date, name, size):
+        self.date = date
+        self.name = name
+        self.size = size
+
+    def peek(self, size):
+        with self.open() as stream:
+            return stream.read(size)
+
+    def read(self):
+        with self.open() as stream:
+            return stream.read()
+
+    def digest(self):
+        hash = sha256()
+        for chunk in self.chunks():
+            hash.update(chunk)
+        return hash.hexdigest()
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        with self.open() as stream:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class ArchiveMember(Member):
+    def __init__(self, enzyme, archive, info, budget):
+        super().__init__(enzyme.date(info), enzyme.name(info), enzyme.size(info))
+        self.enzyme = enzyme
+        self.archive = archive
+        self.info = info
+        self.budget = budget
+        self.compressed = enzyme.compressed(info)
+        self.seen = 0
+
+    def open(self):
+        return GuardedStream(self.enzyme.stream(self.archive, self.info), self, self.budget)
+
+
+class FileMember(Member):
+    def __init__(self, date, name, file):
+        super().__init__(date, name, file.size)
+        self.file = file
+
+    def open(self):
+        self.file.seek(0)
+        return SharedStream(self.file)
+
+    def peek(self, size):
+        self.file.seek(0)
+        return self.file.read(size)
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        return self.file.chunks(chunk_size)
+
+
+class Members(list):
+    def subset(self, members):
+        return Members(members)
+
+    def contents(self):
+        for member in self:
+            yield member, member.read()
+
+    def digests(self):
+        for member in self:
+            yield member, member.digest()
+
+
+class ArchiveMembers(Members):
+    def __init__(self, enzyme, archive, members, source=None):
+        super().__init__(members)
+        self.enzyme = enzyme
+        self.archive = archive
+        self.source = source
+
+    def subset(self, members):
+        return ArchiveMembers(self.enzyme, self.archive, members)
+
+    def contents(self):
+        return self.enzyme.contents(self)
+
+    def digests(self):
+        return self.enzyme.digests(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.enzyme.close(self.archive)
+        if self.source is not None:
+            self.source.close()
+
+
 class Enzyme:
-    def convert(self, content):
-        file = BytesIO(content)
+    magics = []
+
+    def detect(self, header):
+        return any(header.startswith(magic, offset) for offset, magic in self.magics)
+
+    def map(self, file):
+        if isinstance(file, str):
+            path = file
+        elif hasattr(file, 'temporary_file_path'):
+            path = file.temporary_file_path()
+        else:
+            file.seek(0)
+            return file, None
+
+        try:
+            source = MappedFile(path)
+        except ValueError:
+            source = open(path, 'rb')
+
+        return source, source
+
+    def convert(self, file):
+        file, source = self.map(file)
 
         try:
             archive = self.open(file)
         except self.Error:
+            if source is not None:
+                source.close()
             raise EnzymeError('could not open')
+        except EnzymeError:
+            if source is not None:
+                source.close()
+            raise
 
         try:
-            infos = [info for info in self.infos(archive) if self.is_file(info)]
+            infos = [info for info in self.infos(archive) if self.is_file(info) and not ignores(self.name(info), settings.BREW_IGNORE)]
 
             size = sum(self.size(info) for info in infos)
             if size > settings.FILE_UPLOAD_MAX_TEMP_SIZE:
                 raise EnzymeError('cannot have more than 25MB uncompressed')
-
-            return [(self.date(info), self.name(info), self.read(archive, info)) for info in infos]
-        finally:
+        except Exception:
             self.close(archive)
+            if source is not None:
+                source.close()
+            raise
+
+        budget = Budget(settings.FILE_UPLOAD_MAX_TEMP_SIZE, settings.BREW_MAX_RATIO)
+
+        return ArchiveMembers(self, archive, [ArchiveMember(self, archive, info, budget) for info in infos], source)
+
+    def contents(self, members):
+        for member in members:
+            yield member, member.read()
+
+    def digests(self, members):
+        for member in members:
+            yield member, member.digest()
 
 
 class ZipEnzyme(Enzyme):
     extension = 'zip'
+    magics = [
+        (0, b'PK\x03\x04'),
+        (0, b'PK\x05\x06'),
+    ]
     Error = BadZipFile
 
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.executor = None
+        self.lock = Lock()
+
+    def get_workers(self):
+        if self.workers is None:
+            return settings.BREW_INFLATE_WORKERS
+        return self.workers
+
+    def get_executor(self, workers):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(workers)
+        return self.executor
+
+    def contents(self, members):
+        if self.get_workers() < 2:
+            return super().contents(members)
+        return self.gather(members, ArchiveMember.read)
+
+    def digests(self, members):
+        if self.get_workers() < 2:
+            return super().digests(members)
+        return self.gather(members, ArchiveMember.digest)
+
+    def gather(self, members, function):
+        workers = self.get_workers()
+        executor = self.get_executor(workers)
+        window = 2 * workers
+        pending = deque()
+
+        for member in members:
+            pending.append((member, executor.submit(function, member)))
+            if len(pending) > window:
+                member, future = pending.popleft()
+                yield member, future.result()
+
+        while pending:
+            member, future = pending.popleft()
+            yield member, future.result()
+
     def open(self, file):
         return ZipFile(file)
 
@@ -48,14 +394,17 @@ class ZipEnzyme(Enzyme):
     def size(self, info):
         return info.file_size
 
+    def compressed(self, info):
+        return info.compress_size
+
     def date(self, info):
         return None
 
     def name(self, info):
         return info.filename
 
-    def read(self, archive, info):
-        return archive.read(info.filename)
+    def stream(self, archive, info):
+        return archive.open(info)
 
     def close(self, archive):
         archive.close()
@@ -63,10 +412,14 @@ class ZipEnzyme(Enzyme):
 
 class TarEnzyme(Enzyme):
     extension = 'tar'
+    magics = [
+        (257, b'ustar'),
+    ]
+    mode = 'r:'
     Error = TarError
 
     def open(self, file):
-        return tarfile.open(fileobj=file)
+        return tarfile.open(fileobj=file, mode=self.mode)
 
     def infos(self, archive):
         return archive.getmembers()
@@ -77,14 +430,63 @@ class TarEnzyme(Enzyme):
     def size(self, info):
         return info.size
 
+    def compressed(self, info):
+        return None
+
     def date(self, info):
         return info.mtime
 
     def name(self, info):
         return info.name
 
-    def read(self, archive, info):
-        return archive.extractfile(info).read()
+    def stream(self, archive, info):
+        return archive.extractfile(info)
 
     def close(self, archive):
         archive.close()
+
+
+class CompressedTarEnzyme(TarEnzyme):
+    Error = (TarError, OSError, EOFError, LZMAError, zlib.error)
+
+    def open(self, file):
+        stream = InflatedStream(self.decompress(file), settings.FILE_UPLOAD_MAX_TEMP_SIZE)
+        try:
+            return tarfile.open(fileobj=stream, mode=self.mode)
+        except BaseException:
+            stream.close()
+            raise
+
+    def close(self, archive):
+        archive.close()
+        archive.fileobj.close()
+
+
+class TarGzEnzyme(CompressedTarEnzyme):
+    extension = 'tar.gz'
+    magics = [
+        (0, b'\x1f\x8b'),
+    ]
+
+    def decompress(self, file):
+        return GzipFile(fileobj=file, mode='rb')
+
+
+class TarBz2Enzyme(CompressedTarEnzyme):
+    extension = 'tar.bz2'
+    magics = [
+        (0, b'BZh'),
+    ]
+
+    def decompress(self, file):
+        return BZ2File(file)
+
+
+class TarXzEnzyme(CompressedTarEnzyme):
+    extension = 'tar.xz'
+    magics = [
+        (0, b'\xfd7zXZ\x00'),
+    ]
+
+    def decompress(self, file):
+        return LZMAFile(file)
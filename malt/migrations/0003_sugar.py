@@ -0,0 +1,25 @@
+# Generated by Django 3.1 on 2026-10-17 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('malt', '0002_fileasset_folderasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sugar',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=255)),
+                ('digest', models.CharField(max_length=64)),
+            ],
+            options={
+                'unique_together': {('page', 'name')},
+            },
+        ),
+    ]
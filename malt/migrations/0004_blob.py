@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-17 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('malt', '0003_sugar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('size', models.PositiveIntegerField()),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.files import File
 from django.db import models, transaction, IntegrityError
 from django.dispatch import receiver
 from shortuuid import uuid
@@ -72,8 +73,98 @@ class FileAsset(Asset):
         return public_storage.url(self.key())
 
 
+class Blob(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.PositiveIntegerField()
+    references = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def key(cls, digest):
+        return 'blobs/{}/{}'.format(digest[:2], digest)
+
+    @classmethod
+    def url(cls, digest):
+        return public_storage.url(cls.key(digest))
+
+    @classmethod
+    @transaction.atomic
+    def acquire(cls, digest, sugar):
+        blob, created = cls.objects.select_for_update().get_or_create(digest=digest, defaults={'size': sugar.size})
+        if created:
+            with sugar.open() as stream:
+                public_storage.save(cls.key(digest), File(stream))
+        blob.references += 1
+        blob.save(update_fields=['references'])
+
+    @classmethod
+    @transaction.atomic
+    def release(cls, digest):
+        try:
+            blob = cls.objects.select_for_update().get(digest=digest)
+        except cls.DoesNotExist:
+            return
+        blob.references -= 1
+        if blob.references > 0:
+            blob.save(update_fields=['references'])
+        else:
+            blob.delete()
+
+
+class Sugar(models.Model):
+    page = models.CharField(max_length=64)
+    name = models.CharField(max_length=255)
+    digest = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = [
+            ('page', 'name'),
+        ]
+
+    @classmethod
+    def digests(cls, page):
+        return dict(cls.objects.filter(page=page).values_list('name', 'digest'))
+
+    @classmethod
+    def store(cls, changed, sugars, acquired=None):
+        if acquired is None:
+            acquired = {}
+        for sugar in sugars:
+            digest = changed[sugar.name]
+            Blob.acquire(digest, sugar)
+            acquired[sugar.name] = digest
+
+    @classmethod
+    def release(cls, changed):
+        for digest in changed.values():
+            Blob.release(digest)
+
+    @classmethod
+    @transaction.atomic
+    def record(cls, page, changed, removed):
+        for name, digest in changed.items():
+            sugar, created = cls.objects.get_or_create(page=page, name=name, defaults={'digest': digest})
+            if not created:
+                Blob.release(sugar.digest)
+                sugar.digest = digest
+                sugar.save(update_fields=['digest'])
+        for sugar in cls.objects.filter(page=page, name__in=removed):
+            Blob.release(sugar.digest)
+            sugar.delete()
+
+
 @receiver(models.signals.post_delete, sender=FileAsset)
 def post_file_asset_delete(sender, instance, using, **kwargs):
     key = instance.key()
     if public_storage.exists(key):
         public_storage.delete(key)
+
+
+@receiver(models.signals.post_delete, sender=Blob)
+def post_blob_delete(sender, instance, using, **kwargs):
+    key = Blob.key(instance.digest)
+
+    def delete():
+        if not Blob.objects.filter(digest=instance.digest).exists() and public_storage.exists(key):
+            public_storage.delete(key)
+
+    transaction.on_commit(delete, using=using)
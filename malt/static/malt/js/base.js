@@ -17,6 +17,7 @@ async function upload(uploader, lis, form, span, img) {
     for (let input of form.querySelectorAll('input')) {
         if (input.type === 'file') {
             body.append('name', input.files[0].name);
+            body.append('size', input.files[0].size);
             date = input.files[0].lastModified;
         } else {
             if (input.name === 'action') {
@@ -61,15 +62,55 @@ async function upload(uploader, lis, form, span, img) {
             }
         }
 
-        form.submit();
+        if ('chunk' in body) {
+            uploadChunks(uploader, lis, form, span, img);
+        } else {
+            form.submit();
+        }
     } else {
-        lis[1].textContent = await response.text();
-        lis[0].textContent = 'Error:';
+        showError(uploader, lis, span, img, await response.text());
+    }
+}
+
+
+function showError(uploader, lis, span, img, message) {
+    lis[1].textContent = message;
+    lis[0].textContent = 'Error:';
+
+    img.classList.add('hidden');
+    span.classList.remove('hidden');
+
+    uploader.disabled = false;
+}
 
-        img.classList.add('hidden');
-        span.classList.remove('hidden');
 
-        uploader.disabled = false;
+async function uploadChunks(uploader, lis, form, span, img) {
+    let chunkUploader = new ChunkUploader(form.querySelector('input[name="chunk"]').value, form);
+
+    chunkUploader.report = function (progress) {
+        lis[1].textContent = 'uploading (' + progress + '%)...';
+    };
+
+    let body;
+
+    for (let round = 0; ; round++) {
+        try {
+            body = await chunkUploader.upload();
+            break;
+        } catch (error) {
+            if (!(error instanceof ChunkError) || round >= CHUNK_RETRIES) {
+                showError(uploader, lis, span, img, error.message);
+                return;
+            }
+            lis[1].textContent = 'connection lost, resuming...';
+        }
+    }
+
+    if ('url' in body) {
+        window.location.assign(body.url);
+    } else {
+        let history = body.history.concat([body.error]);
+        showError(uploader, lis, span, img, history.join(' '));
     }
 }
 
@@ -1,9 +1,13 @@
+from io import BytesIO
+
 from django.contrib.auth import get_user_model
+from django.core.files import File
 
 from beer.tests import IntegrationTestCase
 
 from ...models import PowerUser
-from ...caches import power_cache
+from ...brewing import Yeast
+from ...caches import power_cache, brew_cache, validate_cache
 
 User = get_user_model()
 
@@ -50,3 +54,124 @@ class PowerCacheTests(IntegrationTestCase):
         PowerUser.objects.create(user=user)
         power_cache.set(other_user, False)
         self.assertPower(user)
+
+
+class MockYeast(Yeast):
+    pass
+
+
+class OtherMockYeast(Yeast):
+    version = 2
+
+
+class BrewCacheTests(IntegrationTestCase):
+    username = 'u'
+    other_username = 'ou'
+
+    meta = {'date': '0'}
+    other_meta = {'date': '1'}
+
+    url = 'u'
+    other_url = 'ou'
+
+    Yeasts = {'mock': MockYeast}
+    OtherYeasts = {'mock': OtherMockYeast}
+
+    def setUp(self):
+        self.user = User.objects.create_user(self.username)
+        self.digest = brew_cache.digest(File(BytesIO(b'c')))
+        self.other_digest = brew_cache.digest(File(BytesIO(b'oc')))
+
+    def set(self, digest, meta, url):
+        brew_cache.set(self.user, digest, meta, url, [], self.Yeasts)
+
+    def get(self, digest, meta, Yeasts=None):
+        if Yeasts is None:
+            Yeasts = self.Yeasts
+        return brew_cache.get(self.user, digest, meta, Yeasts)
+
+    def testDigestsSameContent(self):
+        self.assertEqual(self.digest, brew_cache.digest(File(BytesIO(b'c'))))
+
+    def testReusesReceivedDigest(self):
+        file = File(BytesIO(b'oc'))
+        file.sha256 = self.digest
+        self.assertEqual(self.digest, brew_cache.digest(file))
+
+    def testDoesNotDigestOtherContent(self):
+        self.assertNotEqual(self.digest, self.other_digest)
+
+    def testMissesBeforeSet(self):
+        self.assertIsNone(self.get(self.digest, self.meta))
+
+    def testHitsAfterSet(self):
+        self.set(self.digest, self.meta, self.url)
+        self.assertEqual(self.url, self.get(self.digest, self.meta)['url'])
+
+    def testMissesWithOtherDigest(self):
+        self.set(self.digest, self.meta, self.url)
+        self.assertIsNone(self.get(self.other_digest, self.meta))
+
+    def testMissesWithOtherMeta(self):
+        self.set(self.digest, self.meta, self.url)
+        self.assertIsNone(self.get(self.digest, self.other_meta))
+
+    def testMissesWithOtherUser(self):
+        self.set(self.digest, self.meta, self.url)
+        other_user = User.objects.create_user(self.other_username)
+        self.assertIsNone(brew_cache.get(other_user, self.digest, self.meta, self.Yeasts))
+
+    def testMissesAfterOtherUserSet(self):
+        self.set(self.digest, self.meta, self.url)
+        other_user = User.objects.create_user(self.other_username)
+        brew_cache.set(other_user, self.other_digest, self.meta, self.other_url, [], self.Yeasts)
+        self.assertIsNone(self.get(self.digest, self.meta))
+
+    def testMissesAfterInvalidate(self):
+        self.set(self.digest, self.meta, self.url)
+        brew_cache.invalidate()
+        self.assertIsNone(self.get(self.digest, self.meta))
+
+    def testMissesWithOtherVersion(self):
+        self.set(self.digest, self.meta, self.url)
+        self.assertIsNone(self.get(self.digest, self.meta, self.OtherYeasts))
+
+    def testMissesAfterOtherSet(self):
+        self.set(self.digest, self.meta, self.url)
+        self.set(self.other_digest, self.meta, self.other_url)
+        self.assertIsNone(self.get(self.digest, self.meta))
+        self.assertEqual(self.other_url, self.get(self.other_digest, self.meta)['url'])
+
+
+class ValidateCacheTests(IntegrationTestCase):
+    meta = {'date': '0'}
+    other_meta = {'date': '1'}
+
+    value = {'valid': True, 'history': []}
+
+    Yeasts = {'mock': MockYeast}
+    OtherYeasts = {'mock': OtherMockYeast}
+
+    def setUp(self):
+        self.digest = validate_cache.digest(File(BytesIO(b'c')))
+        self.other_digest = validate_cache.digest(File(BytesIO(b'oc')))
+
+    def testMissesBeforeSet(self):
+        self.assertIsNone(validate_cache.get(self.digest, self.meta, self.Yeasts))
+
+    def testHitsAfterSet(self):
+        validate_cache.set(self.digest, self.meta, self.value, self.Yeasts)
+        self.assertEqual(self.value, validate_cache.get(self.digest, self.meta, self.Yeasts))
+
+    def testHitsAfterOtherSet(self):
+        validate_cache.set(self.digest, self.meta, self.value, self.Yeasts)
+        validate_cache.set(self.other_digest, self.meta, self.value, self.Yeasts)
+        self.assertEqual(self.value, validate_cache.get(self.digest, self.meta, self.Yeasts))
+
+    def testMissesWithOtherMeta(self):
+        validate_cache.set(self.digest, self.meta, self.value, self.Yeasts)
+        self.assertIsNone(validate_cache.get(self.digest, self.other_meta, self.Yeasts))
+
+    def testMissesWithOtherVersion(self):
+        validate_cache.set(self.digest, self.meta, self.value, self.Yeasts)
+        self.assertIsNone(validate_cache.get(self.digest, self.meta, self.OtherYeasts))
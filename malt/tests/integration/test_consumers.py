@@ -0,0 +1,71 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import override_settings
+
+from beer import private_storage
+from beer.tests import IntegrationTestCase
+
+from ...consumers import BREW_CHANNEL, BrewConsumer
+
+User = get_user_model()
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS)
+class BrewConsumerTests(IntegrationTestCase):
+    channel_name = 'c'
+
+    def setUp(self):
+        self.user = User.objects.create_user('u')
+
+    async def receive(self, channel_name):
+        return await asyncio.wait_for(get_channel_layer().receive(channel_name), 5)
+
+    def enqueue(self, meta):
+        BrewConsumer.enqueue(self.user, ContentFile(b'c', 'n'), meta, 'd', self.channel_name)
+        return async_to_sync(self.receive)(BREW_CHANNEL)
+
+    def brew(self, event):
+        consumer = BrewConsumer()
+        consumer.channel_layer = get_channel_layer()
+        consumer.brew(event)
+        events = []
+        while not events or events[-1]['type'] == 'handler_stage':
+            events.append(async_to_sync(self.receive)(self.channel_name))
+        return events
+
+    def testEnqueues(self):
+        event = self.enqueue({'date': '0'})
+        self.assertEqual(self.user.pk, event['user'])
+        self.assertEqual({'date': '0'}, event['meta'])
+        self.assertTrue(private_storage.exists(event['key']))
+
+    def testReportsStagesAndFails(self):
+        event = self.enqueue({'date': '0'})
+        events = self.brew(event)
+        self.assertEqual(['received', 'n'], list(events[0]['args']))
+        self.assertEqual('handler_failed', events[-1]['type'])
+        self.assertFalse(private_storage.exists(event['key']))
+
+    def testFailsWithBrewError(self):
+        event = self.enqueue({})
+        history, message = self.brew(event)[-1]['args']
+        self.assertEqual('A timestamp is expected and its field name must be date.', message)
+        self.assertFalse(private_storage.exists(event['key']))
+
+    def testFailsWithUnexpectedError(self):
+        event = self.enqueue({'date': '0'})
+        event['user'] = 0
+        with self.assertLogs('malt.consumers', 'ERROR'):
+            events = self.brew(event)
+        self.assertEqual('handler_failed', events[-1]['type'])
+        self.assertFalse(private_storage.exists(event['key']))
@@ -1,12 +1,18 @@
+from hashlib import sha256
 from io import BytesIO
+from zipfile import ZipFile
 
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.core.files import File
+from django.db import transaction, IntegrityError
 
 from beer import public_storage
-from beer.tests import IntegrationTestCase
+from beer.tests import IntegrationTestCase, TransactionIntegrationTestCase
 
-from ...models import PowerUser, FolderAsset, FileAsset
+from ...brewery import Primer
+from ...brewing import History, Yeast
+from ...enzymes import FileMember, Members, ZipEnzyme
+from ...models import PowerUser, FolderAsset, FileAsset, Blob, Sugar
 
 User = get_user_model()
 
@@ -212,3 +218,131 @@ class FileAssetTests(IntegrationTestCase):
         expected = FileAsset.get_or_create(user=user, parent=parent, name=name)
         actual = FileAsset.get_or_create(user=user, parent=parent, name=name)
         self.assertEqual(expected.uid, actual.uid)
+
+
+class SugarTests(IntegrationTestCase):
+    page = 'p'
+    other_page = 'op'
+
+    def testDigestsNothingBeforeRecord(self):
+        self.assertEqual({}, Sugar.digests(self.page))
+
+    def testDigestsAfterRecord(self):
+        Sugar.record(self.page, {'a': 'da', 'b': 'db'}, [])
+        self.assertEqual({'a': 'da', 'b': 'db'}, Sugar.digests(self.page))
+
+    def testDigestsAfterChange(self):
+        Sugar.record(self.page, {'a': 'da', 'b': 'db'}, [])
+        Sugar.record(self.page, {'a': 'oda'}, ['b'])
+        self.assertEqual({'a': 'oda'}, Sugar.digests(self.page))
+
+    def testDoesNotDigestOtherPage(self):
+        Sugar.record(self.page, {'a': 'da'}, [])
+        self.assertEqual({}, Sugar.digests(self.other_page))
+
+    def testDoesNotCreateTwice(self):
+        Sugar.objects.create(page=self.page, name='a', digest='da')
+        with self.assertRaises(IntegrityError):
+            Sugar.objects.create(page=self.page, name='a', digest='da')
+
+
+class LedgerMockYeast(Yeast):
+    def clean(self, meta):
+        return {}
+
+    def referment(self, meta, sugars, removed=()):
+        return None
+
+
+class BlobTests(TransactionIntegrationTestCase):
+    digest = 'd'
+    other_digest = 'od'
+
+    content = b'c'
+
+    def sugar(self):
+        return FileMember(0, 'n', File(BytesIO(self.content)))
+
+    def references(self, digest):
+        return Blob.objects.get(digest=digest).references
+
+    def exists(self, digest):
+        return public_storage.exists(Blob.key(digest))
+
+    def testStoresOnAcquire(self):
+        Blob.acquire(self.digest, self.sugar())
+        self.assertEqual(1, self.references(self.digest))
+        with public_storage.open(Blob.key(self.digest), 'rb') as file:
+            self.assertEqual(self.content, file.read())
+
+    def testCountsOnSecondAcquire(self):
+        Blob.acquire(self.digest, self.sugar())
+        public_storage.delete(Blob.key(self.digest))
+        Blob.acquire(self.digest, self.sugar())
+        self.assertEqual(2, self.references(self.digest))
+        self.assertFalse(self.exists(self.digest))
+
+    def testKeepsAfterPartialRelease(self):
+        Blob.acquire(self.digest, self.sugar())
+        Blob.acquire(self.digest, self.sugar())
+        Blob.release(self.digest)
+        self.assertEqual(1, self.references(self.digest))
+        self.assertTrue(self.exists(self.digest))
+
+    def testDeletesAfterFullRelease(self):
+        Blob.acquire(self.digest, self.sugar())
+        Blob.release(self.digest)
+        self.assertFalse(Blob.objects.filter(digest=self.digest).exists())
+        self.assertFalse(self.exists(self.digest))
+
+    def testKeepsAfterRolledBackRelease(self):
+        Blob.acquire(self.digest, self.sugar())
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Blob.release(self.digest)
+                raise IntegrityError()
+        self.assertEqual(1, self.references(self.digest))
+        self.assertTrue(self.exists(self.digest))
+
+    def testIgnoresReleaseBeforeAcquire(self):
+        Blob.release(self.digest)
+        self.assertFalse(Blob.objects.filter(digest=self.digest).exists())
+
+    def testStoresArchiveMemberOnAcquire(self):
+        buffer = BytesIO()
+        with ZipFile(buffer, 'w') as archive:
+            archive.writestr('n', self.content)
+        with ZipEnzyme().convert(File(BytesIO(buffer.getvalue()), 'archive.zip')) as members:
+            Blob.acquire(self.digest, members[0])
+        with public_storage.open(Blob.key(self.digest), 'rb') as file:
+            self.assertEqual(self.content, file.read())
+
+    def testKeepsOtherBlobsAfterSingleFilePrime(self):
+        Yeasts = {'mock': LedgerMockYeast}
+        contents = {'logo.png': b'l', 'font.ttf': b'f'}
+        sugars = Members(FileMember(0, name, File(BytesIO(content))) for name, content in contents.items())
+        Primer(History()).prime({'view_name': 'mock'}, sugars, Yeasts, True)
+        sugars = Members([FileMember(0, 'photo.jpg', File(BytesIO(b'p')))])
+        Primer(History()).prime({'view_name': 'mock'}, sugars, Yeasts, False)
+        for content in [b'l', b'f', b'p']:
+            self.assertTrue(self.exists(sha256(content).hexdigest()))
+        self.assertEqual(3, Sugar.objects.count())
+
+    def testTracksAcquiredOnStore(self):
+        acquired = {}
+        Sugar.store({'n': self.digest}, [self.sugar()], acquired)
+        self.assertEqual({'n': self.digest}, acquired)
+
+    def testReleasesOnRecordChange(self):
+        Sugar.store({'n': self.digest}, [self.sugar()])
+        Sugar.record('p', {'n': self.digest}, [])
+        Sugar.store({'n': self.other_digest}, [self.sugar()])
+        Sugar.record('p', {'n': self.other_digest}, [])
+        self.assertFalse(Blob.objects.filter(digest=self.digest).exists())
+        self.assertEqual(1, self.references(self.other_digest))
+
+    def testReleasesOnRecordRemoval(self):
+        Sugar.store({'n': self.digest}, [self.sugar()])
+        Sugar.record('p', {'n': self.digest}, [])
+        Sugar.record('p', {}, ['n'])
+        self.assertFalse(Blob.objects.filter(digest=self.digest).exists())
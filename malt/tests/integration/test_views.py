@@ -1,16 +1,25 @@
+import json
 import os
 
+from hashlib import sha256
 from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.urls import resolve
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 
-from beer import public_storage
+from beer import public_storage, private_storage
+from beer.chunking import chunk_store
 from beer.tests import ViewTestCase
+from beer.uphandler import COOKIE_KEY
 
 from ...models import PowerUser, Asset, FolderAsset, FileAsset
-from ...caches import power_cache
+from ...caches import power_cache, brew_cache
+from ...consumers import BREW_CHANNEL
 from ...views import PAGE_SIZE, CSRF_KEY
+from .test_consumers import CHANNEL_LAYERS
 
 User = get_user_model()
 
@@ -749,6 +758,42 @@ class UploadManageViewTests(UploadViewTests, ViewTestCase):
         }
         self.assertPostStatus(data, 404)
 
+    def testPostsCodeInChunks(self):
+        data = {
+            'method': 'code',
+            'name': 'mock',
+            'size': 2 * settings.UPLOAD_CHUNK_SIZE,
+        }
+        self.powerLogin()
+        body = self.post_json(data=data)
+        self.assertIn('chunk', body)
+        chunk_store.delete(resolve(body['chunk']).kwargs['uid'])
+
+    def testPostsCodeWithoutChunks(self):
+        data = {
+            'method': 'code',
+            'name': 'mock',
+            'size': 1,
+        }
+        self.powerLogin()
+        self.assertNotIn('chunk', self.post_json(data=data))
+
+    def testRejectsCodeWithUpperSize(self):
+        data = {
+            'method': 'code',
+            'name': 'mock',
+            'size': settings.FILE_UPLOAD_MAX_TEMP_SIZE + 1,
+        }
+        self.assertPostStatus(data, 400)
+
+    def testRejectsCodeWithInvalidSize(self):
+        data = {
+            'method': 'code',
+            'name': 'mock',
+            'size': 'mock',
+        }
+        self.assertPostStatus(data, 400)
+
     def testPostsAsset(self):
         data = {
             'name': self.name,
@@ -792,6 +837,17 @@ class UploadManageViewTests(UploadViewTests, ViewTestCase):
         }
         self.assertPostsAsset(data, 400, False, None)
 
+    def testRejectsAssetWithUpperSize(self):
+        data = {
+            'name': self.name,
+            'path': '',
+            'size': settings.FILE_UPLOAD_MAX_TEMP_SIZE + 1,
+        }
+        if public_storage.post(self.name, '')['action'].startswith('/'):
+            self.assertPostsAsset(data, 400, True, None)
+        else:
+            self.assertPostsAsset(data, 200, True, None)
+
     def testRejectsAssetWithoutPath(self):
         data = {
             'name': self.name,
@@ -807,6 +863,216 @@ class UploadManageViewTests(UploadViewTests, ViewTestCase):
         self.assertPostsAsset(data, 404, False, None)
 
 
+class UploadChunkViewTests(UploadViewTests, ViewTestCase):
+    view_name = 'upload_chunk'
+
+    content = b'abcdefghij'
+
+    def setUp(self):
+        super().setUp()
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.uid = chunk_store.create(self.user, self.name, len(self.content), {'method': 'asset', 'key': self.key, 'redirect': self.redirect_url})
+
+    def tearDown(self):
+        chunk_store.delete(self.uid)
+
+    def kwargs(self):
+        return {'uid': self.uid}
+
+    def get_status(self):
+        return super().get_status(kwargs=self.kwargs())
+
+    def post_status(self, data=None):
+        return super().post_status(kwargs=self.kwargs(), data=data)
+
+    def postChunk(self, index):
+        content = self.content[4 * index:4 * (index + 1)]
+        url = self.url(kwargs=self.kwargs(), query={'index': index})
+        return self.client.post(url, content, content_type='application/octet-stream')
+
+    def testGetsStatus(self):
+        self.powerLogin()
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            status = json.loads(self.get(kwargs=self.kwargs()).content)
+        self.assertEqual([0, 1, 2], status['missing'])
+
+    def testMissesWithOtherUser(self):
+        user = User.objects.create_user(self.username + self.username, password=self.power_password)
+        PowerUser.objects.create(user=user)
+        self.client.login(username=user.username, password=self.power_password)
+        self.assertEqual(404, self.get_status())
+
+    def testPostsChunksAndCompletes(self):
+        self.powerLogin()
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            for index in [2, 0, 1]:
+                self.assertEqual(200, self.postChunk(index).status_code)
+            body = self.post_json(kwargs=self.kwargs())
+        self.assertTrue(body['url'].startswith(self.redirect_url))
+        with public_storage.open(self.key, 'rb') as file:
+            self.assertEqual(self.content, file.read())
+        self.assertIsNone(chunk_store.get(self.user, self.uid))
+
+    def testEnqueuesCodeIfAsync(self):
+        chunk_store.delete(self.uid)
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.uid = chunk_store.create(self.user, self.name, len(self.content), {'method': 'code'})
+        self.powerLogin()
+        self.client.cookies[COOKIE_KEY] = 'c'
+        with self.settings(UPLOAD_CHUNK_SIZE=4, BREW_ASYNC=True, CHANNEL_LAYERS=CHANNEL_LAYERS):
+            for index in range(3):
+                self.postChunk(index)
+            self.assertEqual(202, self.post_status())
+            event = async_to_sync(get_channel_layer().receive)(BREW_CHANNEL)
+        self.assertEqual(sha256(self.content).hexdigest(), event['digest'])
+        self.assertEqual('c', event['channel_name'])
+        with private_storage.open(event['key'], 'rb') as file:
+            self.assertEqual(self.content, file.read())
+        self.assertIsNone(chunk_store.get(self.user, self.uid))
+
+    def testRejectsChunkWithWrongSize(self):
+        self.powerLogin()
+        url = self.url(kwargs=self.kwargs(), query={'index': 0})
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.assertEqual(400, self.client.post(url, b'a', content_type='application/octet-stream').status_code)
+
+    def testRejectsIncomplete(self):
+        self.powerLogin()
+        with self.settings(UPLOAD_CHUNK_SIZE=4):
+            self.postChunk(0)
+            self.assertEqual(400, self.post_status())
+        self.assertIsNotNone(chunk_store.get(self.user, self.uid))
+
+
+class UploadValidateViewTests(UploadViewTests, ViewTestCase):
+    view_name = 'upload_validate'
+
+    def testPostsInvalid(self):
+        data = {
+            'file': self.open(self.content),
+        }
+        self.powerLogin()
+        body = self.post_json(data=data)
+        self.assertFalse(body['valid'])
+        self.assertIn('error', body)
+
+    def testPostsFromCache(self):
+        data = {
+            'date': 0,
+            'file': self.open(self.content),
+        }
+        self.powerLogin()
+        body = self.post_json(data=data)
+        data['file'] = self.open(self.content)
+        self.assertEqual(body, self.post_json(data=data))
+
+
+class UploadCodeViewTests(UploadViewTests, ViewTestCase):
+    view_name = 'upload_code'
+
+    meta = {'date': '0'}
+
+    brewed_url = '/brewed'
+
+    def setUp(self):
+        super().setUp()
+        self.digest = sha256(self.content).hexdigest()
+        self.other_user = User.objects.create_user('ou')
+
+    def post_file(self):
+        data = dict(self.meta)
+        data['file'] = self.open(self.content)
+        self.powerLogin()
+        return self.post(data=data)
+
+    def assertHits(self):
+        response = self.post_file()
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(self.brewed_url, response['Location'])
+
+    def assertMisses(self):
+        self.assertEqual(200, self.post_file().status_code)
+
+    def testMissesBeforeBrew(self):
+        self.assertMisses()
+
+    def testHitsAfterBrew(self):
+        brew_cache.set(self.user, self.digest, self.meta, self.brewed_url, [])
+        self.assertHits()
+
+    def testMissesAfterOtherUserBrew(self):
+        brew_cache.set(self.user, self.digest, self.meta, self.brewed_url, [])
+        brew_cache.set(self.other_user, 64 * '0', self.meta, 'ou', [])
+        self.assertMisses()
+
+    def testEnqueuesIfAsync(self):
+        self.client.cookies[COOKIE_KEY] = 'c'
+        with self.settings(BREW_ASYNC=True, CHANNEL_LAYERS=CHANNEL_LAYERS):
+            self.assertEqual(204, self.post_file().status_code)
+            event = async_to_sync(get_channel_layer().receive)(BREW_CHANNEL)
+        self.assertEqual(self.digest, event['digest'])
+        self.assertEqual('c', event['channel_name'])
+        self.assertTrue(private_storage.exists(event['key']))
+
+    def testMissesAfterFailedBrew(self):
+        brew_cache.set(self.user, self.digest, self.meta, self.brewed_url, [])
+        data = dict(self.meta)
+        data['file'] = self.open(self.content)
+        data['mock'] = self.open(self.content)
+        self.assertPostStatus(data, 200)
+        self.assertMisses()
+
+
+class UploadCodeBatchViewTests(UploadViewTests, ViewTestCase):
+    view_name = 'upload_code_batch'
+
+    def assertPostResults(self, data, expected):
+        self.powerLogin()
+        results = self.post_json(data=data)['results']
+        self.assertEqual(expected, [result['name'] for result in results])
+        return results
+
+    def testRejectsWithoutFiles(self):
+        data = {
+            'date': 0,
+        }
+        self.assertPostStatus(data, 400)
+
+    def testRejectsWithTooManyFiles(self):
+        data = {
+            'date': 0,
+            'file': [self.open(self.content), self.open(self.content)],
+        }
+        with self.settings(BREW_BATCH_SIZE=1):
+            self.assertPostStatus(data, 400)
+
+    def testPostsResultPerFile(self):
+        a = self.open(self.content)
+        a.name = 'a'
+        b = self.open(self.content)
+        b.name = 'b'
+        data = {
+            'file': [a, b],
+        }
+        for result in self.assertPostResults(data, ['a', 'b']):
+            self.assertIn('error', result)
+            self.assertIsInstance(result['history'], list)
+
+    def testPostsErrorPerFileIfUnexpected(self):
+        a = self.open(self.content)
+        a.name = 'a'
+        data = {
+            'date': 0,
+            'file': [a],
+        }
+        brew_cache.set(self.user, 64 * '0', {}, 'ou', [])
+        with self.settings(BREW_METRICS='mock.metrics'):
+            with self.assertLogs('malt.views', 'ERROR'):
+                result, = self.assertPostResults(data, ['a'])
+        self.assertEqual('Brew failed unexpectedly, please try again.', result['error'])
+        self.assertIsNone(brew_cache.get(self.user, 64 * '0', {}))
+
+
 class UploadAssetViewTests(UploadViewTests, ViewTestCase):
     view_name = 'upload_asset'
 
@@ -881,6 +1147,24 @@ class UploadAssetViewTests(UploadViewTests, ViewTestCase):
         }
         self.assertPostStatusAndData(data, 400, False)
 
+    def testPostRedirectsAndSavesWithDigest(self):
+        data = {
+            'key': self.key,
+            'success_action_redirect': self.redirect_url,
+            'sha256': sha256(self.content).hexdigest(),
+            'file': self.open(self.content),
+        }
+        self.assertPostStatusAndData(data, 302, True)
+
+    def testPostRejectsAndDoesNotSaveWithWrongDigest(self):
+        data = {
+            'key': self.key,
+            'success_action_redirect': self.redirect_url,
+            'sha256': 64 * '0',
+            'file': self.open(self.content),
+        }
+        self.assertPostStatusAndData(data, 400, False)
+
 
 class UploadAssetConfirmViewTests(UploadViewTests, ViewTestCase):
     view_name = 'upload_asset_confirm'
@@ -1,32 +1,50 @@
 import os
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
+from zipfile import ZipFile
 
 from django.core.files import File
 from django.utils.datastructures import MultiValueDict
 
 from beer.tests import UnitTestCase
 
-from ...brewing import BrewError, YeastError, Yeast
-from ...enzymes import EnzymeError, Enzyme
+from ...brewing import BrewError, YeastError, History, Yeast
+from ...enzymes import EnzymeError, FileMember, Members, Enzyme, ZipEnzyme
 from ...brewery import GypsyBrewer, Grower, Primer, Brewery
 
 
 class MockEnzyme(Enzyme):
     extension = 'mock'
 
+    def detect(self, header):
+        return True
+
 
 class FailMockEnzyme(MockEnzyme):
-    def convert(self, content):
+    def convert(self, file):
         raise EnzymeError()
 
 
+class MockMembers(Members):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
 class PassMockEnzyme(MockEnzyme):
-    def __init__(self, members):
-        self.members = members
+    def __init__(self, contents):
+        self.contents = contents
+
+    def convert(self, file):
+        return MockMembers(FileMember(0, name, File(BytesIO(content))) for name, content in self.contents.items())
 
-    def convert(self, content):
-        return self.members
+
+class SkipMockEnzyme(PassMockEnzyme):
+    def detect(self, header):
+        return False
 
 
 class FailMockYeast(Yeast):
@@ -43,7 +61,7 @@ class PassFailMockYeast(PassMockYeast):
     def ferment(self, meta, data, sugars):
         self.raiseBrewError('mock')
 
-    def referment(self, meta, sugars):
+    def referment(self, meta, sugars, removed=()):
         self.raiseBrewError('mock')
 
 
@@ -51,16 +69,55 @@ class PassPassMockYeast(PassMockYeast):
     def ferment(self, meta, data, sugars):
         return None
 
-    def referment(self, meta, sugars):
+    def referment(self, meta, sugars, removed=()):
+        REFERMENTED.append(([sugar.name for sugar in sugars], list(removed)))
         return None
 
 
+class ExcludeMockYeast(PassPassMockYeast):
+    exclude = ['*.tmp']
+
+
+REFERMENTED = []
+
+
+class MockLedger:
+    pages = {}
+    stored = []
+
+    @classmethod
+    def digests(cls, page):
+        return dict(cls.pages.get(page, {}))
+
+    @classmethod
+    def store(cls, changed, sugars, acquired):
+        for sugar in sugars:
+            cls.stored.append(sugar.name)
+            acquired[sugar.name] = changed[sugar.name]
+
+    @classmethod
+    def release(cls, changed):
+        pass
+
+    @classmethod
+    def record(cls, page, changed, removed):
+        digests = cls.pages.setdefault(page, {})
+        digests.update(changed)
+        for name in removed:
+            del digests[name]
+
+
+class MockPrimer(Primer):
+    ledger = MockLedger
+
+
 class BrewingTests:
     MockYeasts = {
         'fail': FailMockYeast,
         'pass': PassMockYeast,
         'pass-fail': PassFailMockYeast,
         'pass-pass': PassPassMockYeast,
+        'exclude': ExcludeMockYeast,
     }
 
 
@@ -74,10 +131,10 @@ class GrowerTests(BrewingTests, UnitTestCase):
         path = os.path.join(self.dir, name)
         with open(path, 'rb') as file:
             content = file.read()
-        return content
+        return FileMember(0, name, File(BytesIO(content)))
 
     def grow(self, name):
-        grower = Grower([])
+        grower = Grower(History())
         return grower.grow(self.open(name), self.MockYeasts)
 
     def assertGrows(self, name, expected):
@@ -116,6 +173,15 @@ class GrowerTests(BrewingTests, UnitTestCase):
     def testDoesNotGrowIfBinary(self):
         self.assertDoesNotGrow('binary.txt')
 
+    def testDoesNotGrowIfNull(self):
+        self.assertDoesNotGrow('null.txt')
+
+    def testDoesNotGrowIfContentNotUtf8(self):
+        self.assertDoesNotGrow('invalid-content.txt')
+
+    def testDoesNotGrowIfPreambleNotUtf8(self):
+        self.assertDoesNotGrow('invalid-preamble.txt')
+
     def testDoesNotGrowIfInvalid(self):
         self.assertDoesNotGrow('invalid.txt')
 
@@ -133,9 +199,15 @@ class GrowerTests(BrewingTests, UnitTestCase):
 
 
 class PrimerTests(BrewingTests, UnitTestCase):
-    def prime(self, meta):
-        primer = Primer([])
-        primer.prime(meta, None, self.MockYeasts)
+    def setUp(self):
+        MockLedger.pages.clear()
+        MockLedger.stored.clear()
+        REFERMENTED.clear()
+
+    def prime(self, meta, contents={}, whole=True):
+        primer = MockPrimer(History())
+        sugars = Members(FileMember(0, name, File(BytesIO(content))) for name, content in contents.items())
+        primer.prime(meta, sugars, self.MockYeasts, whole)
 
     def assertPrimes(self, meta):
         try:
@@ -162,37 +234,132 @@ class PrimerTests(BrewingTests, UnitTestCase):
     def testDoesNotPrimeIfRefermentRaisesBrewError(self):
         self.assertDoesNotPrime({'view_name': 'pass-fail'})
 
+    def testPrimesAllSugarsFirst(self):
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a', 'b': b'b'})
+        self.assertEqual([(['a', 'b'], [])], REFERMENTED)
+
+    def testPrimesOnlyChangedSugars(self):
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a', 'b': b'b', 'c': b'c'})
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a', 'b': b'bb', 'd': b'd'})
+        self.assertEqual((['b', 'd'], ['c']), REFERMENTED[-1])
+
+    def testKeepsOtherSugarsIfSingleFile(self):
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a', 'b': b'b'})
+        self.prime({'view_name': 'pass-pass'}, {'c': b'c'}, False)
+        self.assertEqual((['c'], []), REFERMENTED[-1])
+        self.assertEqual({'a', 'b', 'c'}, set(next(iter(MockLedger.pages.values()))))
+
+    def testDigestsSugarsOnWorkersIfArchive(self):
+        buffer = BytesIO()
+        with ZipFile(buffer, 'w') as archive:
+            archive.writestr('a', b'a')
+            archive.writestr('b', b'b')
+        enzyme = ZipEnzyme(2)
+        primer = MockPrimer(History())
+        with enzyme.convert(buffer) as sugars:
+            primer.prime({'view_name': 'pass-pass'}, sugars, self.MockYeasts, True)
+        self.assertIsNotNone(enzyme.executor)
+        self.assertEqual([(['a', 'b'], [])], REFERMENTED)
+
+    def testPrimesNoSugarsIfUnchanged(self):
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a'})
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a'})
+        self.assertEqual(([], []), REFERMENTED[-1])
+
+    def testDoesNotRecordIfRefermentRaisesBrewError(self):
+        with self.assertRaises(BrewError):
+            self.prime({'view_name': 'pass-fail'}, {'a': b'a'})
+        self.assertEqual({}, MockLedger.pages)
+
+    def testForgetsSugarsOfFermentedPage(self):
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a'})
+        primer = MockPrimer(History())
+        primer.forget(PassPassMockYeast(), None)
+        self.prime({'view_name': 'pass-pass'}, {'a': b'a'})
+        self.assertEqual((['a'], []), REFERMENTED[-1])
 
-class MockGrower(GypsyBrewer):
-    def grow(self, content, Yeasts):
+    def testDoesNotStoreExcludedSugars(self):
+        self.prime({'view_name': 'exclude'}, {'a': b'a', 'b.tmp': b'b'})
+        self.assertEqual(['a'], MockLedger.stored)
+        self.assertEqual({'a'}, set(next(iter(MockLedger.pages.values()))))
+
+
+class MockGrower(Grower):
+    def germinate(self, prefix, size, Yeasts):
         try:
-            Yeast = Yeasts[content.decode('utf-8')]
+            Yeast = Yeasts[prefix.decode('utf-8')]
         except KeyError:
             return None
         return Yeast(), None, None
 
+    def ripen(self, member, input):
+        return input
+
+
+class BaseMockPrimer(GypsyBrewer):
+    def forget(self, yeast, clean_meta):
+        FORGOTTEN.append(type(yeast))
+
 
-class FailMockPrimer(GypsyBrewer):
-    def prime(self, meta, sugars, Yeasts):
+class FailMockPrimer(BaseMockPrimer):
+    def prime(self, meta, sugars, Yeasts, whole=False):
         self.raiseBrewError('mock')
 
 
-class PassMockPrimer(GypsyBrewer):
-    def prime(self, meta, sugars, Yeasts):
+class EnzymeMockPrimer(BaseMockPrimer):
+    def prime(self, meta, sugars, Yeasts, whole=False):
+        raise EnzymeError('mock')
+
+
+class PassMockPrimer(BaseMockPrimer):
+    def prime(self, meta, sugars, Yeasts, whole=False):
+        PRIMED.append(whole)
         return None
 
 
+FORGOTTEN = []
+
+PRIMED = []
+
+
+MEASURES = []
+
+
+def measure(stage, duration):
+    MEASURES.append((stage, duration))
+
+
 class BreweryTests(BrewingTests, UnitTestCase):
+    executor = None
+
+    def setUp(self):
+        MEASURES.clear()
+        FORGOTTEN.clear()
+        PRIMED.clear()
+
     def mock(self, contents):
-        return PassMockEnzyme([(0, name, content) for name, content in contents.items()])
+        return PassMockEnzyme(contents)
 
-    def brew(self, contents, meta, enzymes, Primer):
-        brewery = Brewery()
+    def brew(self, contents, meta, enzymes, Primer, report=None, dry=False):
+        brewery = Brewery(report, self.executor, dry)
+        brewery.threshold = 0
         files = MultiValueDict()
         for name, content in contents.items():
             files[name] = File(BytesIO(content))
         brewery.brew(files, meta, enzymes, self.MockYeasts, MockGrower, Primer)
 
+    def assertMeasures(self, names, meta, enzymes, Primer, expected):
+        with self.settings(BREW_METRICS='malt.tests.unit.test_brewery.measure'):
+            self.brew(names, meta, enzymes, Primer, lambda *args: None)
+        self.assertEqual(expected, [stage for stage, duration in MEASURES])
+        for stage, duration in MEASURES:
+            self.assertGreaterEqual(duration, 0)
+
+    def assertReports(self, names, meta, enzymes, Primer, expected):
+        actual = []
+        self.brew(names, meta, enzymes, Primer, lambda *args: actual.append(args))
+        self.assertEqual(expected, [args[0] for args in actual])
+
     def assertBrews(self, names, meta, enzymes, Primer):
         try:
             self.brew(names, meta, enzymes, Primer)
@@ -203,6 +370,81 @@ class BreweryTests(BrewingTests, UnitTestCase):
         with self.assertRaises(BrewError):
             self.brew(names, meta, enzymes, Primer)
 
+    def assertValidates(self, names, meta, enzymes, Primer):
+        try:
+            self.brew(names, meta, enzymes, Primer, dry=True)
+        except BrewError:
+            self.fail('BrewError raised')
+
+    def assertDoesNotValidate(self, names, meta, enzymes, Primer):
+        with self.assertRaises(BrewError):
+            self.brew(names, meta, enzymes, Primer, dry=True)
+
+    def testForgetsSugarsIfFerments(self):
+        names = {'file': b'pass-pass'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = PassMockPrimer
+        self.assertBrews(names, meta, enzymes, Primer)
+        self.assertEqual([PassPassMockYeast], FORGOTTEN)
+
+    def testPrimesWholeIfArchive(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'a': b'mock'})]
+        Primer = PassMockPrimer
+        self.assertBrews(names, meta, enzymes, Primer)
+        self.assertEqual([True], PRIMED)
+
+    def testDoesNotPrimeWholeIfFile(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = PassMockPrimer
+        self.assertBrews(names, meta, enzymes, Primer)
+        self.assertEqual([False], PRIMED)
+
+    def testDoesNotForgetSugarsIfPrimes(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = PassMockPrimer
+        self.assertBrews(names, meta, enzymes, Primer)
+        self.assertEqual([], FORGOTTEN)
+
+    def testValidatesWithoutFermenting(self):
+        names = {'file': b'pass-fail'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = FailMockPrimer
+        self.assertValidates(names, meta, enzymes, Primer)
+
+    def testValidatesArchiveWithoutFermenting(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'file': b'pass-fail'})]
+        Primer = FailMockPrimer
+        self.assertValidates(names, meta, enzymes, Primer)
+
+    def testValidatesWithoutPriming(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0, 'view_name': 'pass'}
+        enzymes = []
+        self.assertValidates(names, meta, enzymes, Primer)
+
+    def testDoesNotValidateIfCleanRaisesYeastError(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0, 'view_name': 'fail'}
+        enzymes = []
+        self.assertDoesNotValidate(names, meta, enzymes, Primer)
+
+    def testDoesNotValidateArchiveWithTwoYeasts(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'a': b'pass-pass', 'b': b'pass-pass'})]
+        Primer = PassMockPrimer
+        self.assertDoesNotValidate(names, meta, enzymes, Primer)
+
     def testBrews(self):
         names = {'file': b'pass-pass'}
         meta = {'date': 0}
@@ -217,6 +459,13 @@ class BreweryTests(BrewingTests, UnitTestCase):
         Primer = PassMockPrimer
         self.assertBrews(names, meta, enzymes, Primer)
 
+    def testBrewsIfEnzymeDoesNotDetect(self):
+        names = {'file': b'pass-pass'}
+        meta = {'date': 0}
+        enzymes = [SkipMockEnzyme({'a': b'pass-pass', 'b': b'pass-pass'})]
+        Primer = PassMockPrimer
+        self.assertBrews(names, meta, enzymes, Primer)
+
     def testDoesNotBrewWithoutFile(self):
         names = {}
         meta = {'date': 0}
@@ -308,6 +557,13 @@ class BreweryTests(BrewingTests, UnitTestCase):
         Primer = FailMockPrimer
         self.assertDoesNotBrew(names, meta, enzymes, Primer)
 
+    def testDoesNotBrewIfArchiveAndReadRaisesEnzymeError(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'a': b'mock'})]
+        Primer = EnzymeMockPrimer
+        self.assertDoesNotBrew(names, meta, enzymes, Primer)
+
     def testBrewsIfArchiveWithTwoFilesWithoutYeast(self):
         names = {'file': b'mock'}
         meta = {'date': 0}
@@ -328,3 +584,80 @@ class BreweryTests(BrewingTests, UnitTestCase):
         enzymes = [self.mock({'a': b'pass-pass', 'b': b'pass-pass'})]
         Primer = PassMockPrimer
         self.assertDoesNotBrew(names, meta, enzymes, Primer)
+
+    def testReportsStagesIfFile(self):
+        names = {'file': b'pass-pass'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = PassMockPrimer
+        self.assertReports(names, meta, enzymes, Primer, ['received', 'growing', 'fermenting'])
+
+    def testReportsStagesIfArchive(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'a': b'mock', 'b': b'mock'})]
+        Primer = PassMockPrimer
+        self.assertReports(names, meta, enzymes, Primer, ['received', 'growing', 'growing', 'priming'])
+
+    def testReportsGrowingIndicesIfArchive(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({str(index): b'mock' for index in range(6)})]
+        actual = []
+        with self.settings(BREW_WORKERS=1):
+            self.brew(names, meta, enzymes, PassMockPrimer, lambda *args: actual.append(args))
+        self.assertEqual([('growing', index, 6) for index in range(1, 7)], [args for args in actual if args[0] == 'growing'])
+
+    def testMeasuresStagesIfFile(self):
+        names = {'file': b'pass-pass'}
+        meta = {'date': 0}
+        enzymes = []
+        Primer = PassMockPrimer
+        self.assertMeasures(names, meta, enzymes, Primer, ['received', 'growing', 'fermenting'])
+
+    def testMeasuresStagesIfArchive(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({'a': b'mock', 'b': b'mock'})]
+        Primer = PassMockPrimer
+        self.assertMeasures(names, meta, enzymes, Primer, ['received', 'growing', 'priming'])
+
+
+class ParallelBreweryTests:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = cls.Executor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        super().tearDownClass()
+
+    def testDoesNotBrewIfArchiveWithManyYeasts(self):
+        names = {'file': b'mock'}
+        meta = {'date': 0}
+        enzymes = [self.mock({str(i): b'pass-pass' if i % 7 == 3 else b'mock' for i in range(20)})]
+        Primer = PassMockPrimer
+        with self.assertRaises(BrewError) as context:
+            self.brew(names, meta, enzymes, Primer)
+        self.assertEqual('Multiple yeasts found: 3, 10, 17', context.exception.message)
+
+    def testKeepsHistoryInMemberOrder(self):
+        contents = {str(i): b'type: pass-pass\n...\n' if i == 11 else b'mock' for i in range(20)}
+        histories = []
+        for executor in [None, self.executor]:
+            brewery = Brewery(None, executor)
+            brewery.threshold = 0
+            files = {'file': File(BytesIO(b'mock'))}
+            brewery.brew(files, {'date': 0}, [self.mock(contents)], self.MockYeasts, Grower, PassMockPrimer)
+            histories.append(brewery.history.render())
+        self.assertEqual(histories[0], histories[1])
+
+
+class ThreadBreweryTests(ParallelBreweryTests, BreweryTests):
+    Executor = ThreadPoolExecutor
+
+
+class ProcessBreweryTests(ParallelBreweryTests, BreweryTests):
+    Executor = ProcessPoolExecutor
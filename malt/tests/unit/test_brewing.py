@@ -0,0 +1,203 @@
+from beer.tests import UnitTestCase
+
+from yaml import YAMLError
+
+from ...enzymes import Member, Members
+from ...brewing import BrewError, YeastError, History, Parser, Tokenizer, Yeast
+
+
+class HistoryTests(UnitTestCase):
+    def setUp(self):
+        self.history = History()
+
+    def testLogs(self):
+        self.history.log('separator', 2)
+        event, = self.history
+        self.assertEqual('separator', event.code)
+        self.assertEqual((2,), event.args)
+
+    def testRenders(self):
+        self.history.log('received', 'f')
+        self.history.log('separator', 2)
+        self.assertEqual(['Received f.', 'Separator found in line 2.'], self.history.render())
+
+    def testTimesInOrder(self):
+        self.history.log('binary')
+        self.history.log('text')
+        self.assertLessEqual(self.history[0].time, self.history[1].time)
+
+
+class ParserTests(UnitTestCase):
+    def setUp(self):
+        self.parser = Parser(size=2)
+
+    def testLoads(self):
+        self.assertEqual({'a': 1}, self.parser.load('a: 1'))
+
+    def testCaches(self):
+        self.parser.load('a: 1')
+        self.assertIn(self.parser.key('a: 1'), self.parser.cache)
+
+    def testLoadsCopy(self):
+        self.parser.load('a: 1').pop('a')
+        self.assertEqual({'a': 1}, self.parser.load('a: 1'))
+
+    def testEvictsLeastRecent(self):
+        self.parser.load('a: 1')
+        self.parser.load('b: 2')
+        self.parser.load('a: 1')
+        self.parser.load('c: 3')
+        self.assertIn(self.parser.key('a: 1'), self.parser.cache)
+        self.assertNotIn(self.parser.key('b: 2'), self.parser.cache)
+        self.assertIn(self.parser.key('c: 3'), self.parser.cache)
+
+    def testDoesNotCacheInvalid(self):
+        with self.assertRaises(YAMLError):
+            self.parser.load('a: [')
+        self.assertFalse(self.parser.cache)
+
+    def testDoesNotLoadUnsafe(self):
+        with self.assertRaises(YAMLError):
+            self.parser.load('!!python/object/apply:os.getcwd []')
+
+
+class TokenizerTests(UnitTestCase):
+    def scan(self, data, complete=True):
+        tokenizer = Tokenizer(data, complete)
+        if tokenizer.scan():
+            return tokenizer
+        return None
+
+    def assertScans(self, data, line, head, body, complete=True):
+        tokenizer = self.scan(data, complete)
+        self.assertIsNotNone(tokenizer)
+        self.assertEqual(line, tokenizer.line)
+        self.assertEqual(head, tokenizer.head())
+        self.assertEqual(body, tokenizer.body())
+
+    def assertDoesNotScan(self, data, complete=True):
+        self.assertIsNone(self.scan(data, complete))
+
+    def testScans(self):
+        self.assertScans('a\n...\nc\n', 2, 'a\n', 'c\n')
+
+    def testScansWithSpaces(self):
+        self.assertScans('a\n ... \nc\n', 2, 'a\n', 'c\n')
+
+    def testScansInFirstLine(self):
+        self.assertScans('...\nc\n', 1, '', 'c\n')
+
+    def testScansInLastLine(self):
+        self.assertScans('a\n...', 2, 'a\n', '')
+
+    def testScansFirstSeparator(self):
+        self.assertScans('a\n...\nb\n...\nc\n', 2, 'a\n', 'b\n...\nc\n')
+
+    def testScansBytes(self):
+        tokenizer = self.scan(b'a\n...\nc\n')
+        self.assertEqual(2, tokenizer.line)
+        self.assertIsInstance(tokenizer.head(), memoryview)
+        self.assertEqual(b'a\n', tokenizer.head().tobytes())
+        self.assertEqual(b'c\n', tokenizer.body().tobytes())
+
+    def testDoesNotScanEmpty(self):
+        self.assertDoesNotScan('')
+
+    def testDoesNotScanWithoutSeparator(self):
+        self.assertDoesNotScan('a\nb\nc\n')
+
+    def testDoesNotScanWithWrongSeparator(self):
+        self.assertDoesNotScan('a\n.. .\nc\n')
+
+    def testDoesNotScanWithLineSeparator(self):
+        self.assertDoesNotScan('a\n...c\nc\n')
+
+    def testDoesNotScanIncompleteLastLine(self):
+        self.assertDoesNotScan('a\n...', False)
+
+    def testScansIncompleteBeforeLastLine(self):
+        self.assertScans('a\n...\nc', 2, 'a\n', 'c', False)
+
+
+class YeastTests(UnitTestCase):
+    def sift(self, include, exclude, names):
+        yeast = Yeast()
+        yeast.include = include
+        yeast.exclude = exclude
+        sugars = Members(Member(None, name, 0) for name in names)
+        return [sugar.name for sugar in yeast.sift(sugars)]
+
+    def testSiftsAll(self):
+        self.assertEqual(['a.png', 'b.txt'], self.sift([], [], ['a.png', 'b.txt']))
+
+    def testSiftsIncluded(self):
+        self.assertEqual(['a.png', 'c/d.png'], self.sift(['*.png'], [], ['a.png', 'b.txt', 'c/d.png']))
+
+    def testSiftsNotExcluded(self):
+        self.assertEqual(['b.txt'], self.sift([], ['*.png'], ['a.png', 'b.txt', 'c/d.png']))
+
+    def testSiftsIncludedNotExcluded(self):
+        self.assertEqual(['a.png'], self.sift(['*.png'], ['c/*'], ['a.png', 'b.txt', 'c/d.png']))
+
+
+class SchemaMockYeast(Yeast):
+    expected = ['a', 'b']
+    also_expected = {'c': int}
+    optional = {'d': str, 'e': list}
+
+    def pre_process(self, meta):
+        self.processed = []
+        return None
+
+    def post_pre_process(self, meta_data):
+        self.processed.append(meta_data)
+
+    def process(self, data):
+        pass
+
+    def post_process(self, sugars):
+        pass
+
+    def process_d(self, value):
+        self.processed.append(value)
+
+
+class SchemaTests(UnitTestCase):
+    def setUp(self):
+        self.yeast = SchemaMockYeast()
+
+    def testCompilesOnce(self):
+        self.assertIs(SchemaMockYeast.schema, self.yeast.schema)
+        self.assertIsNot(Yeast.schema, self.yeast.schema)
+
+    def testCleans(self):
+        self.assertEqual({'a': 'a', 'b': 'b'}, self.yeast.clean({'a': 'a', 'b': 'b', 'c': 'c'}))
+
+    def testDoesNotCleanWithAllErrors(self):
+        with self.assertRaises(YeastError) as context:
+            self.yeast.clean({'b': 0})
+        self.assertEqual('expected a, b must be a string', str(context.exception))
+
+    def testValidates(self):
+        clean_meta_data, processes, errors = self.yeast.schema.validate({'c': 0, 'd': 'd', 'f': 'f'})
+        self.assertEqual({'c': 0}, clean_meta_data)
+        self.assertEqual([(SchemaMockYeast.process_d, 'd')], processes)
+        self.assertEqual([], errors)
+
+    def testDoesNotValidateWithAllErrors(self):
+        clean_meta_data, processes, errors = self.yeast.schema.validate({'d': 0, 'e': []})
+        self.assertEqual([
+            'This yeast requires a value for c.',
+            'The value for d must be of type str.',
+            'Processing of e not implemented.',
+        ], errors)
+
+    def testFerments(self):
+        self.yeast.ferment({}, 'c: 0\nd: d\n...\nbody', Members())
+        self.assertEqual([{'c': 0}, 'd'], self.yeast.processed)
+
+    def testDoesNotFermentBeforeProcessing(self):
+        with self.assertRaises(BrewError) as context:
+            self.yeast.ferment({}, 'c: c\nd: 0\n...\nbody', Members())
+        self.assertEqual('The value for c must be of type int. The value for d must be of type str.', context.exception.message)
+        self.assertEqual([], self.yeast.processed)
@@ -1,8 +1,15 @@
 import os
+import tarfile
+
+from hashlib import sha256
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
 
 from beer.tests import UnitTestCase
 
-from ...enzymes import EnzymeError, ZipEnzyme, TarEnzyme
+from ...enzymes import HEADER_SIZE, EnzymeError, FileMember, ZipEnzyme, TarEnzyme, TarGzEnzyme, TarBz2Enzyme, TarXzEnzyme
 
 
 class EnzymeTests:
@@ -15,29 +22,113 @@ class EnzymeTests:
         path = os.path.join(self.dir, name)
         with open(path, 'rb') as file:
             content = file.read()
-        return content
+        return BytesIO(content)
 
     def openArchives(self, name):
         for extension in self.extensions:
             yield self.openFile('{}.{}'.format(name, extension))
 
+    def pathArchives(self, name):
+        for extension in self.extensions:
+            yield os.path.join(self.dir, '{}.{}'.format(name, extension))
+
+    def assertDoesNotDetectFile(self, name):
+        file = self.openFile(name)
+        self.assertFalse(self.enzyme.detect(file.read(HEADER_SIZE)))
+
+    def assertDetectsArchives(self, name):
+        for file in self.openArchives(name):
+            self.assertTrue(self.enzyme.detect(file.read(HEADER_SIZE)))
+
     def assertDoesNotConvertFile(self, name):
-        content = self.openFile(name)
+        file = self.openFile(name)
         with self.assertRaises(EnzymeError):
-            self.enzyme.convert(content)
+            self.enzyme.convert(file)
 
     def assertDoesNotConvertArchives(self, name):
-        for content in self.openArchives(name):
+        for file in self.openArchives(name):
             with self.assertRaises(EnzymeError):
-                self.enzyme.convert(content)
+                self.enzyme.convert(file)
 
     def assertConvertsArchives(self, name, expected):
-        for content in self.openArchives(name):
-            actual = [member[1] for member in self.enzyme.convert(content)]
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                actual = [member.name for member in members]
             self.assertEqual(len(expected), len(actual))
             for expected_name, actual_name in zip(sorted(expected), sorted(actual)):
                 self.assertEqual(expected_name, actual_name)
 
+    def assertReadsArchives(self, name, expected):
+        content = self.openFile(expected).read()
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                member, = members
+                self.assertEqual(expected, member.name)
+                self.assertEqual(len(content), member.size)
+                self.assertEqual(content[:10], member.peek(10))
+                self.assertEqual(content, member.read())
+                self.assertEqual(content, b''.join(member.chunks(1000)))
+
+    def assertCountsArchives(self, name):
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                for member in members:
+                    member.peek(10)
+                    member.read()
+                    b''.join(member.chunks(1000))
+                    self.assertEqual(member.size, member.seen)
+                self.assertEqual(sum(member.size for member in members), member.budget.total)
+
+    def assertDoesNotReadArchives(self, name, limit):
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                for member in members:
+                    member.budget.limit = limit
+                with self.assertRaises(EnzymeError):
+                    for member in members:
+                        member.read()
+
+    def assertDoesNotConvertPath(self, name):
+        with self.assertRaises(EnzymeError):
+            self.enzyme.convert(os.path.join(self.dir, name))
+
+    def assertConvertsPaths(self, name, expected):
+        for path in self.pathArchives(name):
+            with self.enzyme.convert(path) as members:
+                actual = [(member.name, member.read()) for member in members]
+            self.assertEqual(sorted(expected), sorted(name for name, content in actual))
+            for name, content in actual:
+                self.assertEqual(self.openFile(os.path.basename(name)).read(), content)
+
+    def assertContentsArchives(self, name):
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                expected = [(member.name, member.read()) for member in members]
+                actual = [(member.name, content) for member, content in members.contents()]
+                self.assertEqual(expected, actual)
+
+    def assertDigestsArchives(self, name):
+        for file in self.openArchives(name):
+            with self.enzyme.convert(file) as members:
+                expected = [(member.name, sha256(member.read()).hexdigest()) for member in members]
+                actual = [(member.name, digest) for member, digest in members.digests()]
+                self.assertEqual(expected, actual)
+
+    def testDoesNotDetectEmptyFile(self):
+        self.assertDoesNotDetectFile('empty_file')
+
+    def testDoesNotDetectBinaryFile(self):
+        self.assertDoesNotDetectFile('file.bin')
+
+    def testDoesNotDetectTextFile(self):
+        self.assertDoesNotDetectFile('file.txt')
+
+    def testDetectsArchivesWithZeroLevels(self):
+        self.assertDetectsArchives('zero')
+
+    def testDetectsArchivesWithOneLevel(self):
+        self.assertDetectsArchives('one')
+
     def testDoesNotConvertEmptyFile(self):
         self.assertDoesNotConvertFile('empty_file')
 
@@ -59,6 +150,62 @@ class EnzymeTests:
     def testConvertsArchivesWithTextFile(self):
         self.assertConvertsArchives('text', ['file.txt'])
 
+    def testReadsArchivesWithEmptyFile(self):
+        self.assertReadsArchives('empty', 'empty_file')
+
+    def testReadsArchivesWithBinaryFile(self):
+        self.assertReadsArchives('binary', 'file.bin')
+
+    def testReadsArchivesWithTextFile(self):
+        self.assertReadsArchives('text', 'file.txt')
+
+    def testContentsArchivesWithZeroLevels(self):
+        self.assertContentsArchives('zero')
+
+    def testContentsArchivesWithThreeLevels(self):
+        self.assertContentsArchives('three')
+
+    def testDigestsArchivesWithZeroLevels(self):
+        self.assertDigestsArchives('zero')
+
+    def testDigestsArchivesWithThreeLevels(self):
+        self.assertDigestsArchives('three')
+
+    def testConvertsArchivesWithoutJunk(self):
+        self.assertConvertsArchives('junk', ['file.txt'])
+
+    def testConvertsArchivesWithJunkIfNotIgnored(self):
+        with self.settings(BREW_IGNORE=[]):
+            self.assertConvertsArchives('junk', [
+                '__MACOSX/._file.txt',
+                '._file.txt',
+                '.DS_Store',
+                'folder/Thumbs.db',
+                'file.txt',
+            ])
+
+    def testCountsArchivesWithThreeLevels(self):
+        self.assertCountsArchives('three')
+
+    def testDoesNotReadArchivesOverBudget(self):
+        self.assertDoesNotReadArchives('text', 10)
+
+    def testDoesNotConvertEmptyPath(self):
+        self.assertDoesNotConvertPath('empty_file')
+
+    def testDoesNotConvertTextPath(self):
+        self.assertDoesNotConvertPath('file.txt')
+
+    def testConvertsPathsWithTwoLevels(self):
+        self.assertConvertsPaths('two', [
+            'folder/empty_file',
+            'folder/file.bin',
+            'folder/file.txt',
+            'empty_file',
+            'file.bin',
+            'file.txt',
+        ])
+
     def testConvertsArchivesWithZeroLevels(self):
         self.assertConvertsArchives('zero', [])
 
@@ -97,7 +244,82 @@ class ZipEnzymeTests(EnzymeTests, UnitTestCase):
     enzyme = ZipEnzyme()
     extensions = ['zip']
 
+    def testDoesNotReadArchivesWithHighRatio(self):
+        self.assertDoesNotReadArchives('ratio', settings.FILE_UPLOAD_MAX_TEMP_SIZE)
+
+    def testReadsArchivesWithHighRatioUnderLimit(self):
+        with self.settings(BREW_MAX_RATIO=2000):
+            file, = self.openArchives('ratio')
+            with self.enzyme.convert(file) as members:
+                member, = members
+                self.assertEqual(member.size, len(member.read()))
+
+
+class ParallelZipEnzymeTests(EnzymeTests, UnitTestCase):
+    enzyme = ZipEnzyme(4)
+    extensions = ['zip']
+
+    def testDigestsArchivesOnWorkers(self):
+        enzyme = ZipEnzyme(2)
+        file, = self.openArchives('three')
+        with enzyme.convert(file) as members:
+            list(members.digests())
+        self.assertIsNotNone(enzyme.executor)
+
 
 class TarEnzymeTests(EnzymeTests, UnitTestCase):
     enzyme = TarEnzyme()
-    extensions = ['tar', 'tar.gz', 'tar.bz2']
+    extensions = ['tar']
+
+
+class CompressedTarEnzymeTests(EnzymeTests):
+    def testDoesNotConvertIgnoredBombs(self):
+        buffer = BytesIO()
+        with tarfile.open(fileobj=buffer, mode=self.mode) as archive:
+            info = tarfile.TarInfo('Thumbs.db')
+            info.size = 65536
+            archive.addfile(info, BytesIO(bytes(info.size)))
+        buffer.seek(0)
+        with self.settings(FILE_UPLOAD_MAX_TEMP_SIZE=16384):
+            with self.assertRaises(EnzymeError):
+                self.enzyme.convert(buffer)
+
+
+class TarGzEnzymeTests(CompressedTarEnzymeTests, UnitTestCase):
+    enzyme = TarGzEnzyme()
+    extensions = ['tar.gz']
+    mode = 'w:gz'
+
+
+class TarBz2EnzymeTests(CompressedTarEnzymeTests, UnitTestCase):
+    enzyme = TarBz2Enzyme()
+    extensions = ['tar.bz2']
+    mode = 'w:bz2'
+
+
+class TarXzEnzymeTests(CompressedTarEnzymeTests, UnitTestCase):
+    enzyme = TarXzEnzyme()
+    extensions = ['tar.xz']
+    mode = 'w:xz'
+
+
+class FileMemberTests(UnitTestCase):
+    content = b'abcdefghij'
+
+    def setUp(self):
+        self.file = File(BytesIO(self.content))
+        self.member = FileMember(0, 'n', self.file)
+
+    def testOpensFromStart(self):
+        self.file.read(4)
+        with self.member.open() as stream:
+            self.assertEqual(self.content, stream.read())
+
+    def testDoesNotCloseFileAfterOpen(self):
+        with self.member.open() as stream:
+            stream.read()
+        self.assertFalse(self.file.closed)
+        self.assertEqual(self.content, self.member.read())
+
+    def testPeeks(self):
+        self.assertEqual(self.content[:4], self.member.peek(4))
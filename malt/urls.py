@@ -12,6 +12,9 @@ urlpatterns = [
     path('user/demote/<int:pk>/', views.UserDemoteView.as_view(), name='user_demote'),
     path('upload/manage/', views.UploadManageView.as_view(), name='upload_manage'),
     path('upload/code/', views.UploadCodeView.as_view(), name='upload_code'),
+    path('upload/code/batch/', views.UploadCodeBatchView.as_view(), name='upload_code_batch'),
+    path('upload/validate/', views.UploadValidateView.as_view(), name='upload_validate'),
+    path('upload/chunk/<str:uid>/', views.UploadChunkView.as_view(), name='upload_chunk'),
     path('upload/asset/', views.UploadAssetView.as_view(), name='upload_asset'),
     path('upload/asset/confirm/', views.UploadAssetConfirmView.as_view(), name='upload_asset_confirm'),
     path('assets/', views.AssetManageView.as_view(), {'path': ''}, name='asset_manage'),
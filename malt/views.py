@@ -1,26 +1,36 @@
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import EmptyPage, Paginator
-from django.http import HttpResponseNotFound, HttpResponseBadRequest, JsonResponse
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseNotFound, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
 from django.views import generic
 from django.views.generic.base import ContextMixin, TemplateResponseMixin
 from django.views.generic.detail import SingleObjectTemplateResponseMixin, BaseDetailView
 
 from beer import public_storage
+from beer.chunking import ChunkError, chunk_store
+from beer.uphandler import COOKIE_KEY
 
 from .models import PowerUser, FolderAsset, FileAsset
 from .forms import UserForm, AssetForm
-from .caches import power_cache, member_cache
+from .caches import power_cache, member_cache, brew_cache, validate_cache
 from .brewing import BrewError
 from .brewery import Brewery
+from .consumers import BrewConsumer
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 PAGE_SIZE = 50
 
@@ -189,7 +199,17 @@ class UploadManageView(LoginRequiredMixin, UserIsPowerMixin, AssetMixin, generic
         except KeyError:
             return HttpResponseBadRequest()
 
+        try:
+            size = int(body.pop('size', 0))
+        except ValueError:
+            return HttpResponseBadRequest()
+
         if method == 'code':
+            if size > settings.UPLOAD_CHUNK_SIZE:
+                if size > settings.FILE_UPLOAD_MAX_TEMP_SIZE:
+                    return HttpResponseBadRequest('A file cannot have more than 25MB.')
+                uid = chunk_store.create(request.user, name, size, {'method': 'code'})
+                body['chunk'] = reverse('upload_chunk', kwargs={'uid': uid})
             body['action'] = reverse('upload_code'),
             return JsonResponse(body)
 
@@ -217,6 +237,11 @@ class UploadManageView(LoginRequiredMixin, UserIsPowerMixin, AssetMixin, generic
 
             if body['action'].startswith('/'):
                 body[CSRF_KEY] = request.POST[CSRF_KEY]
+                if size > settings.UPLOAD_CHUNK_SIZE:
+                    if size > settings.FILE_UPLOAD_MAX_TEMP_SIZE:
+                        return HttpResponseBadRequest('A file cannot have more than 25MB.')
+                    uid = chunk_store.create(request.user, name, size, {'method': 'asset', 'key': key, 'redirect': redirect_url})
+                    body['chunk'] = reverse('upload_chunk', kwargs={'uid': uid})
             return JsonResponse(body)
 
         return HttpResponseNotFound()
@@ -234,16 +259,213 @@ class UploadCodeView(LoginRequiredMixin, UserIsPowerMixin, MaltMixin, ContextMix
         except KeyError:
             pass
 
+        if len(request.FILES) == 1 and 'file' in request.FILES:
+            digest = brew_cache.digest(request.FILES['file'])
+            brewed = brew_cache.get(request.user, digest, meta)
+            if brewed is not None:
+                return redirect(brewed['url'])
+
+            channel_name = request.COOKIES.get(COOKIE_KEY)
+            if settings.BREW_ASYNC and channel_name is not None:
+                BrewConsumer.enqueue(request.user, request.FILES['file'], meta, digest, channel_name)
+                return HttpResponse(status=204)
+        else:
+            digest = None
+
         try:
-            url = brewery.brew(request.FILES, meta)
+            url = brewery.brew(request.FILES, dict(meta))
         except BrewError as error:
+            brew_cache.invalidate()
             context = self.get_context_data(**kwargs)
             context['error'] = error
             return self.render_to_response(context)
 
+        if digest is not None:
+            brew_cache.set(request.user, digest, meta, url, brewery.history)
+        else:
+            brew_cache.invalidate()
+
         return redirect(url)
 
 
+class UploadValidateView(LoginRequiredMixin, UserIsPowerMixin, generic.View):
+    def post(self, request, *args, **kwargs):
+        meta = request.POST.dict()
+        try:
+            del meta[CSRF_KEY]
+        except KeyError:
+            pass
+
+        if len(request.FILES) == 1 and 'file' in request.FILES:
+            digest = brew_cache.digest(request.FILES['file'])
+            validated = validate_cache.get(digest, meta)
+            if validated is not None:
+                return JsonResponse(validated)
+        else:
+            digest = None
+
+        brewery = Brewery(dry=True)
+
+        try:
+            brewery.brew(request.FILES, dict(meta))
+        except BrewError as error:
+            validated = {
+                'valid': False,
+                'history': error.history.render(),
+                'error': error.message,
+            }
+        else:
+            validated = {
+                'valid': True,
+                'history': brewery.history.render(),
+            }
+
+        if digest is not None:
+            validate_cache.set(digest, meta, validated)
+
+        return JsonResponse(validated)
+
+
+class UploadChunkView(LoginRequiredMixin, UserIsPowerMixin, generic.View):
+    def get_session(self):
+        session = chunk_store.get(self.request.user, self.kwargs['uid'])
+        if session is None:
+            raise Http404()
+        return session
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_session()
+        try:
+            return JsonResponse(chunk_store.status(kwargs['uid'], session))
+        except ChunkError as error:
+            return HttpResponseNotFound(str(error))
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_session()
+
+        if 'index' not in request.GET:
+            return self.complete(request, kwargs['uid'], session)
+
+        try:
+            index = int(request.GET['index'])
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        try:
+            chunk_store.write(kwargs['uid'], session, index, request.body)
+            return JsonResponse(chunk_store.status(kwargs['uid'], session))
+        except ChunkError as error:
+            return HttpResponseBadRequest(str(error))
+
+    def complete(self, request, uid, session):
+        try:
+            file = chunk_store.open(uid, session)
+        except ChunkError as error:
+            return HttpResponseBadRequest(str(error))
+
+        try:
+            data = session['data']
+
+            if data['method'] == 'asset':
+                public_storage.save(data['key'], file)
+                return JsonResponse({'url': '{}?{}'.format(data['redirect'], urlencode({'key': data['key']}, safe='/'))})
+
+            meta = request.POST.dict()
+            try:
+                del meta[CSRF_KEY]
+            except KeyError:
+                pass
+
+            digest = brew_cache.digest(file)
+            brewed = brew_cache.get(request.user, digest, meta)
+            if brewed is not None:
+                return JsonResponse({'url': brewed['url']})
+
+            channel_name = request.COOKIES.get(COOKIE_KEY)
+            if settings.BREW_ASYNC and channel_name is not None:
+                BrewConsumer.enqueue(request.user, file, meta, digest, channel_name)
+                return JsonResponse({'queued': True}, status=202)
+
+            brewery = Brewery()
+
+            try:
+                url = brewery.brew(MultiValueDict({'file': [file]}), dict(meta))
+            except BrewError as error:
+                brew_cache.invalidate()
+                return JsonResponse({'error': error.message, 'history': error.history.render()}, status=400)
+
+            brew_cache.set(request.user, digest, meta, url, brewery.history)
+
+            return JsonResponse({'url': url})
+        finally:
+            file.close()
+            chunk_store.delete(uid)
+
+
+class UploadCodeBatchView(LoginRequiredMixin, UserIsPowerMixin, generic.View):
+    def post(self, request, *args, **kwargs):
+        meta = request.POST.dict()
+        try:
+            del meta[CSRF_KEY]
+        except KeyError:
+            pass
+
+        files = [file for name, files in request.FILES.lists() for file in files]
+
+        if not files:
+            return HttpResponseBadRequest()
+        expected = settings.BREW_BATCH_SIZE
+        actual = len(files)
+        if actual > expected:
+            return HttpResponseBadRequest('A batch cannot have more than {} files (it has {}).'.format(expected, actual))
+
+        with ThreadPoolExecutor(min(settings.BREW_BATCH_WORKERS, actual)) as executor:
+            results = list(executor.map(lambda file: self.brew(request.user, file, meta), files))
+
+        return JsonResponse({'results': results})
+
+    def brew(self, user, file, meta):
+        try:
+            digest = brew_cache.digest(file)
+            brewed = brew_cache.get(user, digest, meta)
+            if brewed is not None:
+                return {
+                    'name': file.name,
+                    'url': brewed['url'],
+                    'history': brewed['history'].render(),
+                }
+
+            brewery = Brewery()
+
+            try:
+                url = brewery.brew(MultiValueDict({'file': [file]}), dict(meta))
+            except BrewError as error:
+                brew_cache.invalidate()
+                return {
+                    'name': file.name,
+                    'error': error.message,
+                    'history': error.history.render(),
+                }
+
+            brew_cache.set(user, digest, meta, url, brewery.history)
+
+            return {
+                'name': file.name,
+                'url': url,
+                'history': brewery.history.render(),
+            }
+        except Exception:
+            logger.exception('Brew of %s failed', file.name)
+            brew_cache.invalidate()
+            return {
+                'name': file.name,
+                'error': 'Brew failed unexpectedly, please try again.',
+                'history': [],
+            }
+        finally:
+            connections.close_all()
+
+
 class UploadAssetView(LoginRequiredMixin, UserIsPowerMixin, generic.View):
     def post(self, request, *args, **kwargs):
         if settings.CONTAINED:
@@ -266,7 +488,14 @@ class UploadAssetView(LoginRequiredMixin, UserIsPowerMixin, generic.View):
         except KeyError:
             return HttpResponseBadRequest()
 
-        public_storage.save(key, file)
+        digest = request.POST.get('sha256')
+        if digest and digest != brew_cache.digest(file):
+            return HttpResponseBadRequest()
+
+        if hasattr(file, 'move'):
+            file.move(public_storage, key)
+        else:
+            public_storage.save(key, file)
 
         return redirect('{}?{}'.format(url, urlencode({'key': key}, safe='/')))
 